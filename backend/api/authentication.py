@@ -0,0 +1,37 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_CACHE_KEY = 'token:{}'
+
+
+def token_cache_key(key):
+    return TOKEN_CACHE_KEY.format(sha256(key.encode()).hexdigest())
+
+
+def forget_token(key):
+    cache.delete(token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который хранит токен вместе с пользователем
+    в кэше TOKEN_CACHE_TIMEOUT секунд.
+
+    Запись удаляется сигналами при удалении токена (выход через djoser,
+    удаление пользователя) и при сохранении пользователя. Без общего
+    для воркеров кэша (SHARED_CACHE) удаление видел бы только один
+    воркер, и отозванный токен действовал бы в остальных, поэтому
+    токены тогда не кэшируются.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.SHARED_CACHE:
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, settings.TOKEN_CACHE_TIMEOUT)
+        return token.user, token
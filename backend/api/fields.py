@@ -0,0 +1,84 @@
+from uuid import uuid4
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from foodgram_backend.constants import FILE_SIGNATURE_LENGTH
+
+
+class StreamedBase64ImageField(Base64ImageField):
+    """Base64ImageField, который принимает и файл, уже декодированный
+    парсером RecipeJSONParser."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        signature = data.read(FILE_SIGNATURE_LENGTH)
+        data.seek(0)
+        extension = self.get_file_extension(data.name, signature)
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        data.name = f'{uuid4()}.{extension}'
+        return serializers.ImageField.to_internal_value(self, data)
+
+
+def get_objects_in_bulk(queryset, pks, message):
+    """Достаёт объекты по списку ключей одним запросом in_bulk.
+
+    Если части ключей нет в базе, сообщает сразу обо всех.
+    """
+    found = queryset.in_bulk(pks)
+    missing = [pk for pk in pks if pk not in found]
+    if missing:
+        raise serializers.ValidationError(
+            message.format(pk_values=', '.join(map(str, missing)))
+        )
+    return [found[pk] for pk in pks]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список связанных объектов, проверяемый одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.to_internal_value_list(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при many=True не делает
+    отдельный запрос на каждый ключ."""
+
+    default_error_messages = {
+        'does_not_exist_list': 'Объекты с id {pk_values} не существуют.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def to_internal_value_list(self, data):
+        return get_objects_in_bulk(
+            self.get_queryset(),
+            [self.to_pk(item) for item in data],
+            self.error_messages['does_not_exist_list'],
+        )
@@ -1,16 +1,33 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import F, FloatField, Func, IntegerField, Value
+from django.db.models.functions import Cast, Length, Upper
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from foodgram_backend.constants import (POPULAR_RECIPE_ORDERING,
+                                        RECIPE_ORDERING,
+                                        SEARCH_CONFIG)
+from recipes.models import Ingredient, Recipe, Tag
 
 
 class RecipeFilter(filters.FilterSet):
-    """Фильтрация рецептов по тегам."""
+    """Фильтрация рецептов по тегам и полнотекстовый поиск."""
 
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
+    )
     is_favorited = filters.BooleanFilter(method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
+    search = filters.CharFilter(method='search_filter')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='ordering_filter',
+    )
 
     class Meta:
         model = Recipe
@@ -28,6 +45,18 @@ class RecipeFilter(filters.FilterSet):
             queryset = queryset.filter(recipe_to_buy__user_to_buy=user)
         return queryset
 
+    def search_filter(self, queryset, _, value):
+        """Поиск по названию, ингредиентам и описанию рецепта."""
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+        ).order_by('-search_rank', *RECIPE_ORDERING)
+
+    def ordering_filter(self, queryset, _, value):
+        return queryset.order_by(*POPULAR_RECIPE_ORDERING)
+
 
 class IngredientFilter(filters.FilterSet):
     """Фильтрация ингредиентов."""
@@ -37,3 +66,85 @@ class IngredientFilter(filters.FilterSet):
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+
+def autocomplete_ingredients(queryset, name, limit):
+    """Подсказки ингредиентов: сначала совпадения по началу названия,
+    затем по вхождению, затем похожие по триграммам (с опечатками).
+
+    Каждая группа выбирается отдельным подзапросом со своим индексом
+    и ограничением, результаты объединяются через UNION ALL.
+    Внутри первых двух групп короткие названия идут раньше длинных,
+    в последней — более похожие.
+    """
+    queryset = queryset.annotate(upper_name=Upper('name'))
+    groups = (
+        queryset.filter(name__istartswith=name).annotate(
+            similarity=Value(1.0, output_field=FloatField()),
+        ),
+        queryset.filter(name__icontains=name).exclude(
+            name__istartswith=name
+        ).annotate(
+            similarity=Value(1.0, output_field=FloatField()),
+        ),
+        queryset.filter(upper_name__trigram_similar=name).exclude(
+            name__icontains=name
+        ).annotate(
+            similarity=TrigramSimilarity(Upper('name'), name),
+        ),
+    )
+    groups = [
+        group.annotate(
+            rank=Value(rank, output_field=IntegerField()),
+            length=Length('name'),
+        ).order_by('-similarity', 'length', 'name')[:limit]
+        for rank, group in enumerate(groups)
+    ]
+    return groups[0].union(*groups[1:], all=True).order_by(
+        'rank', '-similarity', 'length', 'name'
+    )[:limit]
+
+
+class IntArrayIntersection(Func):
+    """Пересечение целочисленных массивов (оператор & из intarray)."""
+
+    template = '(%(expressions)s)'
+    arg_joiner = ' & '
+    output_field = ArrayField(IntegerField())
+
+
+class IntArrayCount(Func):
+    """Число элементов целочисленного массива (icount из intarray)."""
+
+    function = 'icount'
+    output_field = IntegerField()
+
+
+def recipes_by_coverage(queryset, ingredient_ids, max_missing=None):
+    """Рецепты, которые можно приготовить из заданных ингредиентов.
+
+    Кандидаты отбираются по GIN-индексу на Recipe.ingredient_ids,
+    пересечение считается функциями расширения intarray. Порядок —
+    по доле ингредиентов рецепта, которые уже есть, затем по числу
+    недостающих.
+    """
+    queryset = queryset.filter(ingredient_ids__overlap=ingredient_ids)
+    if max_missing == 0:
+        queryset = queryset.filter(
+            ingredient_ids__contained_by=ingredient_ids
+        )
+    ingredients_count = IntArrayCount('ingredient_ids')
+    covered_count = IntArrayCount(IntArrayIntersection(
+        'ingredient_ids',
+        Cast(
+            Value(ingredient_ids),
+            output_field=ArrayField(IntegerField()),
+        ),
+    ))
+    queryset = queryset.annotate(
+        missing_count=ingredients_count - covered_count,
+        coverage=Cast(covered_count, FloatField()) / ingredients_count,
+    )
+    if max_missing is not None:
+        queryset = queryset.filter(missing_count__lte=max_missing)
+    return queryset.order_by('-coverage', 'missing_count', *RECIPE_ORDERING)
@@ -0,0 +1,194 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from foodgram_backend.constants import METRICS_DURATION_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Обработчик сделал больше запросов к БД, чем позволяет бюджет."""
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: запросы к БД, время БД,
+    сериализации и обработки целиком."""
+
+    def __init__(self):
+        self.endpoint = None
+        self.query_budget = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.total_time = 0.0
+        self.started = perf_counter()
+        self.recording = False
+
+    @contextmanager
+    def record_queries(self):
+        """Считает запросы соединений текущего потока.
+
+        Вложенный вызов ничего не делает, чтобы запросы не считались
+        дважды, когда их уже считает middleware в том же потоке.
+        """
+        if self.recording:
+            yield
+            return
+        self.recording = True
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.record_query)
+                    )
+                yield
+        finally:
+            self.recording = False
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    def measure_serializer(self, serializer):
+        """Засекает время to_representation сериализатора."""
+        to_representation = serializer.to_representation
+
+        def timed(instance):
+            started = perf_counter()
+            try:
+                return to_representation(instance)
+            finally:
+                self.serializer_time += perf_counter() - started
+
+        serializer.to_representation = timed
+        return serializer
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+    @property
+    def over_budget(self):
+        return (
+            self.query_budget is not None
+            and self.queries > self.query_budget
+        )
+
+    def check_budget(self):
+        if not self.over_budget:
+            return
+        message = (
+            f'{self.endpoint}: {self.queries} запросов к БД '
+            f'при бюджете {self.query_budget}'
+        )
+        if settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class MetricsRegistry:
+    """Накопленные метрики процесса по обработчикам.
+
+    Каждый воркер gunicorn считает свои запросы сам.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(self.empty_stats)
+
+    @staticmethod
+    def empty_stats():
+        return {
+            'requests': 0,
+            'queries': 0,
+            'db_time': 0.0,
+            'serializer_time': 0.0,
+            'total_time': 0.0,
+            'budget_exceeded': 0,
+            'buckets': [0] * len(METRICS_DURATION_BUCKETS),
+        }
+
+    def observe(self, metrics):
+        with self.lock:
+            stats = self.endpoints[metrics.endpoint]
+            stats['requests'] += 1
+            stats['queries'] += metrics.queries
+            stats['db_time'] += metrics.db_time
+            stats['serializer_time'] += metrics.serializer_time
+            stats['total_time'] += metrics.total_time
+            stats['budget_exceeded'] += metrics.over_budget
+            for number, bound in enumerate(METRICS_DURATION_BUCKETS):
+                if metrics.total_time <= bound:
+                    stats['buckets'][number] += 1
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self.lock:
+            endpoints = sorted(
+                (endpoint, {**stats, 'buckets': list(stats['buckets'])})
+                for endpoint, stats in self.endpoints.items()
+            )
+        lines = []
+        for name, kind, help_text, key in (
+            ('foodgram_requests_total', 'counter',
+             'Количество запросов.', 'requests'),
+            ('foodgram_db_queries_total', 'counter',
+             'Количество запросов к БД.', 'queries'),
+            ('foodgram_db_duration_seconds_total', 'counter',
+             'Время запросов к БД.', 'db_time'),
+            ('foodgram_serializer_duration_seconds_total', 'counter',
+             'Время сериализации ответов.', 'serializer_time'),
+            ('foodgram_query_budget_exceeded_total', 'counter',
+             'Превышения бюджета запросов к БД.', 'budget_exceeded'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, stats in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats[key]}')
+        name = 'foodgram_request_duration_seconds'
+        lines.append(f'# HELP {name} Время обработки запросов.')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, stats in endpoints:
+            for bound, count in zip(
+                METRICS_DURATION_BUCKETS, stats['buckets']
+            ):
+                lines.append(
+                    f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                    f'{count}'
+                )
+            lines.append(
+                f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} '
+                f'{stats["requests"]}'
+            )
+            lines.append(
+                f'{name}_sum{{endpoint="{endpoint}"}} {stats["total_time"]}'
+            )
+            lines.append(
+                f'{name}_count{{endpoint="{endpoint}"}} {stats["requests"]}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,117 @@
+import asyncio
+import random
+from hashlib import sha256
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram_backend.db import REPLICA_PIN_KEY, read_from
+from .metrics import RequestMetrics, registry
+
+
+class HybridMiddleware:
+    """Middleware, который работает и под WSGI, и под ASGI без
+    переключения потоков: __call__ для WSGI, __acall__ для ASGI."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django 3.2 отличает асинхронный middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Считает запросы к БД и время обработки запроса.
+
+    Имя обработчика и бюджет запросов задаёт MetricsMixin, для
+    остальных представлений берётся имя маршрута. Итог отдаётся
+    в заголовке Server-Timing и копится в реестре для /metrics.
+
+    Под ASGI middleware работает в цикле событий, а представления —
+    в других потоках, поэтому запросы к БД считает MetricsMixin
+    в потоке представления.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = request.metrics = RequestMetrics()
+        with metrics.record_queries():
+            response = self.get_response(request)
+        return self.finish(request, metrics, response)
+
+    async def __acall__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        response = await self.get_response(request)
+        return self.finish(request, metrics, response)
+
+    def finish(self, request, metrics, response):
+        metrics.total_time = perf_counter() - metrics.started
+        if metrics.endpoint is None:
+            match = request.resolver_match
+            metrics.endpoint = match.view_name if match else 'not_found'
+        response['Server-Timing'] = metrics.server_timing()
+        registry.observe(metrics)
+        metrics.check_budget()
+        return response
+
+
+class ReplicaMiddleware(HybridMiddleware):
+    """Читает данные для безопасных запросов к API из реплики.
+
+    После успешного изменяющего запроса клиент на REPLICA_PIN_SECONDS
+    закрепляется за основной базой, чтобы сразу видеть свои изменения,
+    пока они доходят до реплик. Клиент определяется по заголовку
+    Authorization.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with read_from(self.choose_database(request)):
+            response = self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        with read_from(self.choose_database(request)):
+            response = await self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    @staticmethod
+    def pin_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return REPLICA_PIN_KEY.format(
+            sha256(authorization.encode()).hexdigest()
+        )
+
+    def choose_database(self, request):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or not request.path.startswith('/api/')
+        ):
+            return None
+        key = self.pin_key(request)
+        if key is not None and cache.get(key):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def pin(self, request, response):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method in SAFE_METHODS
+            or response.status_code >= 400
+        ):
+            return
+        key = self.pin_key(request)
+        if key is not None:
+            cache.set(key, True, settings.REPLICA_PIN_SECONDS)
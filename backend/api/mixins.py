@@ -0,0 +1,217 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+from foodgram_backend.db import read_from
+from recipes.cache import get_catalogue_version
+from .offload import offload
+
+_catalogues = {}
+
+RESPONSE_CACHE_KEY = 'response:{}'
+
+
+class CachedCatalogueMixin:
+    """Отдаёт каталог из памяти процесса, пока не изменилась его версия.
+
+    Версия хранится в кэше Django и меняется сигналами при сохранении
+    и удалении объектов, она же используется для ETag. Last-Modified
+    не отдаётся: его точность — секунда, и изменение в ту же секунду
+    давало бы устаревший ответ 304.
+    """
+
+    def get_catalogue(self, version):
+        model = self.queryset.model
+        cached = _catalogues.get(model)
+        if cached is None or cached[0] != version:
+            # Каталог читается из основной базы: реплика может отставать
+            # от новой версии, и устаревший каталог остался бы в памяти.
+            serializer = self.get_serializer(
+                self.queryset.using(DEFAULT_DB_ALIAS), many=True
+            )
+            cached = (version, {item['id']: item for item in serializer.data})
+            _catalogues[model] = cached
+        return cached[1]
+
+    def filter_catalogue(self, items):
+        return items
+
+    def catalogue_response(self, request, get_data):
+        model = self.queryset.model
+        version = get_catalogue_version(model)
+        etag = f'"{model._meta.model_name}-{version}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(get_data(self.get_catalogue(version)))
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.catalogue_response(
+            request,
+            lambda catalogue: self.filter_catalogue(list(catalogue.values())),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_item(catalogue):
+            try:
+                return catalogue[int(kwargs[self.lookup_field])]
+            except (KeyError, ValueError):
+                raise exceptions.NotFound
+
+        return self.catalogue_response(request, get_item)
+
+
+class AnonymousCacheMixin:
+    """Кэширует ответы list и retrieve анонимным пользователям: они
+    одинаковы для всех.
+
+    Ключ кэша и ETag строятся из версий get_cache_versions, адреса,
+    параметров запроса и формата ответа. Запросы с параметрами не из
+    cache_params не кэшируются. Ответы отдаются с Cache-Control: public
+    и могут кэшироваться nginx, остальные — с Cache-Control: private.
+    Без общего для воркеров кэша (SHARED_CACHE) новые версии видны
+    не всем воркерам, и ответы не кэшируются.
+    """
+
+    cache_params = ()
+    response_digest = None
+
+    def get_cache_versions(self):
+        raise NotImplementedError
+
+    def get_response_digest(self, request):
+        params = request.query_params
+        if (
+            not settings.SHARED_CACHE
+            or request.user.is_authenticated
+            or request.accepted_renderer.format != 'json'
+            or not set(params) <= set(self.cache_params)
+        ):
+            return None
+        key = (
+            self.get_cache_versions(),
+            request.build_absolute_uri(request.path),
+            sorted((name, sorted(params.getlist(name))) for name in params),
+            request.accepted_media_type,
+        )
+        return sha256(repr(key).encode()).hexdigest()
+
+    def cached_response(self, request, view, *args, **kwargs):
+        self.response_digest = self.get_response_digest(request)
+        if self.response_digest is None:
+            return view(request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=f'"{self.response_digest}"'
+        )
+        if response is not None:
+            return response
+        cached = cache.get(RESPONSE_CACHE_KEY.format(self.response_digest))
+        if cached is None:
+            # Ответ сохранится под новой версией на RECIPE_CACHE_TIMEOUT,
+            # а реплика может ещё не получить изменение, которое её
+            # сменило.
+            with read_from(DEFAULT_DB_ALIAS):
+                return view(request, *args, **kwargs)
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.action not in ('list', 'retrieve'):
+            return response
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        if self.response_digest is None:
+            patch_cache_control(response, private=True)
+            return response
+        if response.status_code not in (200, 304):
+            return response
+        if isinstance(response, Response):
+            response.render()
+            cache.set(
+                RESPONSE_CACHE_KEY.format(self.response_digest),
+                (response.content, response['Content-Type']),
+                settings.RECIPE_CACHE_TIMEOUT,
+            )
+        response['ETag'] = f'"{self.response_digest}"'
+        patch_cache_control(
+            response, public=True, max_age=settings.RECIPE_CACHE_MAX_AGE
+        )
+        return response
+
+
+class MetricsMixin:
+    """Передаёт MetricsMiddleware имя обработчика вида
+    RecipeViewSet.list, его бюджет запросов к БД и время сериализации.
+
+    Бюджет задаётся словарём query_budgets по действиям и
+    переопределяется настройкой QUERY_BUDGETS.
+    """
+
+    query_budgets = {}
+
+    def get_endpoint_name(self):
+        return f'{type(self).__name__}.{self.action}'
+
+    def get_query_budget(self, endpoint):
+        return settings.QUERY_BUDGETS.get(
+            endpoint, self.query_budgets.get(self.action)
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return super().dispatch(request, *args, **kwargs)
+        with metrics.record_queries():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        metrics = getattr(request._request, 'metrics', None)
+        if metrics is not None:
+            metrics.endpoint = self.get_endpoint_name()
+            metrics.query_budget = self.get_query_budget(metrics.endpoint)
+        super().initial(request, *args, **kwargs)
+
+    def measure_serializer(self, serializer):
+        metrics = getattr(self.request._request, 'metrics', None)
+        if metrics is None:
+            return serializer
+        return metrics.measure_serializer(serializer)
+
+    def get_serializer(self, *args, **kwargs):
+        return self.measure_serializer(
+            super().get_serializer(*args, **kwargs)
+        )
+
+
+class AsyncActionsMixin:
+    """Под ASGI (SERVER_MODE=asgi) отдаёт маршруты с действиями из
+    async_actions асинхронными представлениями, см. api.offload."""
+
+    async_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if settings.SERVER_MODE != 'asgi':
+            return view
+        if set(cls.async_actions) & set((actions or {}).values()):
+            return offload(view)
+        return view
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from foodgram_backend.db import check_connections
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEW_THREADS,
+            thread_name_prefix='async-views',
+        )
+    return _executor
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет представление в потоке пула как отдельный запрос:
+    со своим соединением с БД и с готовым телом ответа."""
+    close_old_connections()
+    check_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        if response.streaming:
+            # Django 3.2 читает потоковый ответ в цикле событий,
+            # где ORM недоступен, поэтому он собирается здесь.
+            response.streaming_content = list(response.streaming_content)
+        return response
+    finally:
+        close_old_connections()
+
+
+def offload(view):
+    """Асинхронная обёртка синхронного представления для ASGI.
+
+    Синхронные представления Django 3.2 под ASGI выполняет по очереди
+    в одном общем потоке. Обёрнутое представление выполняется
+    в ограниченном пуле потоков ASYNC_VIEW_THREADS, и медленные
+    запросы не задерживают остальные.
+    """
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(
+            run_view, thread_sensitive=False, executor=get_executor()
+        )(view, request, *args, **kwargs)
+
+    return wraps(view)(async_view)
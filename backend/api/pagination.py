@@ -1,8 +1,44 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
-from foodgram_backend.constants import PAGE_SIZE
+from foodgram_backend.constants import (MAX_PAGE_SIZE, PAGE_SIZE,
+                                        RECIPE_ORDERING)
+from recipes.feed import feed_recipe_ids
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Пагинация по ключу (pub_date, id) без OFFSET и COUNT(*)."""
+
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = RECIPE_ORDERING
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Курсорная пагинация ленты подписок.
+
+    Перед выборкой страницы рецепты ограничиваются теми, что идут
+    в ленте пользователя сразу после позиции курсора, — без
+    сканирования всех рецептов подписок.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        offset, reverse, position = (
+            self.decode_cursor(request) or (0, False, None)
+        )
+        recipe_ids = feed_recipe_ids(
+            request.user,
+            position,
+            reverse,
+            limit=offset + page_size + 1,
+        )
+        return super().paginate_queryset(
+            queryset.filter(pk__in=recipe_ids), request, view
+        )
@@ -0,0 +1,206 @@
+import base64
+import binascii
+import codecs
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json
+
+from foodgram_backend.constants import (BASE64_HEADER_LENGTH,
+                                        STREAM_CHUNK_SIZE)
+
+QUOTE_OR_ESCAPE = re.compile(r'["\\]')
+
+UNICODE_ESCAPE = re.compile(r'[0-9a-fA-F]{4}')
+
+JSON_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t',
+}
+
+
+class Base64FieldExtractor:
+    """Вырезает из потока JSON строковое значение ключа верхнего уровня
+    и по мере чтения декодирует его из base64 во временный файл.
+
+    Остальной документ накапливается как есть, а вместо значения поля
+    в нём остаётся null.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.parts = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.unicode_escape = None
+        self.string = []
+        self.last_string = None
+        self.await_value = False
+        self.in_value = False
+        self.header = ''
+        self.header_done = False
+        self.pending = ''
+        self.file = None
+
+    def feed(self, text):
+        position = 0
+        while position < len(text):
+            if self.in_value:
+                position = self.feed_value(text, position)
+            else:
+                position = self.feed_json(text, position)
+
+    def feed_json(self, text, position):
+        for index in range(position, len(text)):
+            char = text[index]
+            if self.in_string:
+                self.parts.append(char)
+                if self.escape:
+                    self.escape = False
+                    self.string.append(char)
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    self.last_string = ''.join(self.string)
+                else:
+                    self.string.append(char)
+                continue
+            if self.await_value and not char.isspace():
+                self.await_value = False
+                if char == '"':
+                    self.start_value()
+                    return index + 1
+            if char == '"':
+                self.in_string = True
+                self.string = []
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+            elif char == ':' and self.depth == 1:
+                self.await_value = self.last_string == self.field
+            self.parts.append(char)
+        return len(text)
+
+    def start_value(self):
+        self.in_value = True
+        self.parts.append('null')
+        self.file = TemporaryUploadedFile(
+            name=self.field,
+            content_type=None,
+            size=0,
+            charset=None,
+        )
+
+    def feed_value(self, text, position):
+        if self.unicode_escape is not None:
+            return self.feed_unicode_escape(text, position)
+        if self.escape:
+            self.escape = False
+            char = text[position]
+            if char == 'u':
+                self.unicode_escape = ''
+            elif char in JSON_ESCAPES:
+                self.write(JSON_ESCAPES[char])
+            else:
+                raise ParseError('JSON parse error - invalid escape')
+            return position + 1
+        match = QUOTE_OR_ESCAPE.search(text, position)
+        end = match.start() if match else len(text)
+        self.write(text[position:end])
+        if match is None:
+            return end
+        if match.group() == '"':
+            self.finish_value()
+        else:
+            self.escape = True
+        return end + 1
+
+    def feed_unicode_escape(self, text, position):
+        """Собирает четыре цифры \\uXXXX, которые могут прийти в разных
+        частях тела запроса."""
+        end = position + 4 - len(self.unicode_escape)
+        self.unicode_escape += text[position:end]
+        if len(self.unicode_escape) == 4:
+            if not UNICODE_ESCAPE.fullmatch(self.unicode_escape):
+                raise ParseError('JSON parse error - invalid \\uXXXX escape')
+            self.write(chr(int(self.unicode_escape, 16)))
+            self.unicode_escape = None
+        return min(end, len(text))
+
+    def write(self, segment):
+        if not self.header_done:
+            self.header += segment
+            if ',' in self.header:
+                _, _, segment = self.header.partition(',')
+            elif len(self.header) > BASE64_HEADER_LENGTH:
+                segment = self.header
+            else:
+                return
+            self.header_done = True
+        data = self.pending + segment
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        if usable:
+            self.decode(data[:usable])
+
+    def decode(self, data):
+        try:
+            self.file.write(base64.b64decode(data, validate=True))
+        except binascii.Error:
+            raise ParseError('Изображение должно быть закодировано в base64.')
+
+    def finish_value(self):
+        self.in_value = False
+        if not self.header_done:
+            self.header_done = True
+            self.pending += self.header
+        if self.pending:
+            self.decode(self.pending)
+        self.file.size = self.file.tell()
+        self.file.seek(0)
+
+    def get_json(self):
+        if self.in_string or self.in_value:
+            raise ParseError('JSON parse error - unterminated string')
+        return ''.join(self.parts)
+
+
+class RecipeJSONParser(JSONParser):
+    """JSON-парсер, который не держит в памяти изображение рецепта:
+    тело запроса читается частями, а base64 из поля image сразу
+    декодируется во временный файл."""
+
+    file_field = 'image'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        extractor = Base64FieldExtractor(self.file_field)
+        try:
+            for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+                extractor.feed(decoder.decode(chunk))
+            extractor.feed(decoder.decode(b'', final=True))
+            parse_constant = json.strict_constant if self.strict else None
+            data = json.loads(
+                extractor.get_json(),
+                parse_constant=parse_constant,
+            )
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+        if extractor.file is not None and isinstance(data, dict):
+            data[self.file_field] = extractor.file
+            request = parser_context.get('request')
+            if request is not None:
+                # Django закроет и удалит временный файл в конце запроса.
+                request._request._files = MultiValueDict(
+                    {self.file_field: [extractor.file]}
+                )
+        return data
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import CharField, Value
+from django.utils.functional import cached_property
+
+from recipes.models import Favorite, Shopping_cart
+from users.models import Subscription
+
+# Вид связи: модель, поле пользователя и поле id в множестве.
+RELATIONS = {
+    'subscriptions': (Subscription, 'subscriber_id', 'author_id'),
+    'favorites': (Favorite, 'user_id', 'recipe_id'),
+    'shopping_cart': (Shopping_cart, 'user_to_buy_id', 'recipe_to_buy_id'),
+}
+RELATION_KINDS = {model: kind for kind, (model, _, _) in RELATIONS.items()}
+
+RELATIONS_CACHE_KEY = 'relations:{}:{}'
+
+EMPTY_RELATIONS = dict.fromkeys(RELATIONS, frozenset())
+
+
+def relations_cache_key(kind, user_id):
+    return RELATIONS_CACHE_KEY.format(kind, user_id)
+
+
+def load_relations(user_id):
+    """Множества связей пользователя из кэша, при промахе — одним
+    запросом к основной БД для всех видов сразу: реплика может ещё не
+    получить изменение, из-за которого множество удалено из кэша."""
+    keys = {kind: relations_cache_key(kind, user_id) for kind in RELATIONS}
+    cached = cache.get_many(keys.values())
+    if len(cached) == len(keys):
+        return {kind: cached[key] for kind, key in keys.items()}
+    ids = {kind: set() for kind in RELATIONS}
+    first, *rest = (
+        model.objects.using(DEFAULT_DB_ALIAS).filter(
+            **{user_field: user_id}
+        ).annotate(
+            kind=Value(kind, output_field=CharField())
+        ).values_list('kind', target_field)
+        for kind, (model, user_field, target_field) in RELATIONS.items()
+    )
+    for kind, target_id in first.union(*rest, all=True):
+        ids[kind].add(target_id)
+    relations = {kind: frozenset(values) for kind, values in ids.items()}
+    cache.set_many(
+        {keys[kind]: values for kind, values in relations.items()},
+        settings.RELATIONS_CACHE_TIMEOUT,
+    )
+    return relations
+
+
+def forget_relation(instance):
+    """Удаляет из кэша множество, в которое входит добавленная или
+    удалённая связь: оно загрузится заново при следующем чтении.
+
+    Множество не дополняется на месте: чтение и запись в кэш не
+    атомарны, и одновременные изменения связей одного пользователя
+    теряли бы друг друга.
+    """
+    kind = RELATION_KINDS[type(instance)]
+    _, user_field, _ = RELATIONS[kind]
+    cache.delete(relations_cache_key(kind, getattr(instance, user_field)))
+
+
+class UserRelations:
+    """id авторов, на которых подписан пользователь, рецептов в его
+    избранном и в списке покупок.
+
+    Множества берутся из кэша RELATIONS_CACHE_TIMEOUT секунд, который
+    сбрасывается сигналами при изменении связей, и переиспользуются до
+    конца запроса.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def ids(self):
+        if self.user is None or not self.user.is_authenticated:
+            return EMPTY_RELATIONS
+        return load_relations(self.user.pk)
+
+    @property
+    def subscriptions(self):
+        return self.ids['subscriptions']
+
+    @property
+    def favorites(self):
+        return self.ids['favorites']
+
+    @property
+    def shopping_cart(self):
+        return self.ids['shopping_cart']
+
+
+def get_user_relations(request):
+    """Связи текущего пользователя, общие для всего запроса."""
+    if request is None:
+        return UserRelations(None)
+    if not hasattr(request, 'user_relations'):
+        request.user_relations = UserRelations(request.user)
+    return request.user_relations
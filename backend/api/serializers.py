@@ -1,26 +1,133 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+from django.utils.functional import cached_property
 from djoser.serializers import UserCreateSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.fields import SkipField, get_attribute
+from rest_framework.relations import PKOnlyObject
 from rest_framework.validators import UniqueTogetherValidator
 
 from foodgram_backend.constants import (MAX_AMOUNT, MAX_COOKING_TIME,
                                         MIN_AMOUNT, MIN_COOKING_TIME)
 from recipes import models
+from recipes.images import image_srcset, image_thumbnail, image_url
+from recipes.shopping_list import update_shopping_lists
 from users.models import CustomUser, Subscription
+from .fields import (BulkPrimaryKeyRelatedField, StreamedBase64ImageField,
+                     get_objects_in_bulk)
+from .relations import get_user_relations
+
+PLAIN_FIELDS = {
+    serializers.ReadOnlyField: None,
+    serializers.CharField: str,
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+}
+
+RECIPE_SYSTEM_FIELDS = (
+    'favorites_count', 'carts_count', 'in_feeds', 'image_variants',
+)
+
+
+def plain_get_attribute(instance, source_attrs):
+    """get_attribute DRF без проверок на каждом шаге: если по пути
+    встретился вызываемый объект, значение достаётся обычным путём."""
+    value = instance
+    try:
+        for attr in source_attrs:
+            value = getattr(value, attr)
+            if callable(value):
+                return get_attribute(instance, source_attrs)
+    except ObjectDoesNotExist:
+        return None
+    return value
+
+
+class FieldPlanMixin:
+    """Быстрое чтение: поля сериализатора один раз раскладываются в план,
+    по которому собирается словарь для каждого объекта.
+
+    Простые поля, SerializerMethodField и вложенные сериализаторы
+    с планом выводятся без обхода полей DRF, остальные — как обычно.
+    Результат совпадает с Serializer.to_representation.
+    """
+
+    use_field_plan = True
 
+    @staticmethod
+    def compile_field(field):
+        """Функция, переводящая значение атрибута в представление поля,
+        или None, если поле выводится обычным путём."""
+        field_type = type(field)
+        if field_type in PLAIN_FIELDS:
+            return PLAIN_FIELDS[field_type] or field.to_representation
+        if field_type is serializers.SerializerMethodField:
+            return getattr(field.parent, field.method_name)
+        if isinstance(field, FieldPlanMixin):
+            return field.to_representation
+        if (
+            field_type is serializers.ListSerializer
+            and isinstance(field.child, FieldPlanMixin)
+        ):
+            child = field.child.to_representation
+
+            def to_list(value):
+                if isinstance(value, Manager):
+                    value = value.all()
+                return [child(item) for item in value]
+
+            return to_list
+        return None
+
+    @cached_property
+    def field_plan(self):
+        return [
+            (field, field.field_name, field.source_attrs,
+             self.compile_field(field))
+            for field in self._readable_fields
+        ]
 
-class CustomUserSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        if not self.use_field_plan:
+            return super().to_representation(instance)
+        ret = {}
+        for field, name, source_attrs, convert in self.field_plan:
+            if convert is None:
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+                if isinstance(attribute, PKOnlyObject):
+                    check_for_none = attribute.pk
+                else:
+                    check_for_none = attribute
+                ret[name] = (
+                    None if check_for_none is None
+                    else field.to_representation(attribute)
+                )
+                continue
+            try:
+                attribute = plain_get_attribute(instance, source_attrs)
+            except (KeyError, AttributeError):
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+            ret[name] = None if attribute is None else convert(attribute)
+        return ret
+
+
+class CustomUserSerializer(FieldPlanMixin, serializers.ModelSerializer):
     """Сериализатор для чтения модели пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return bool(
-            self.context['request']
-            and user.is_authenticated
-            and obj.author.filter(subscriber=user).exists()
-        )
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        relations = get_user_relations(self.context.get('request'))
+        return obj.pk in relations.subscriptions
 
     class Meta:
         model = CustomUser
@@ -41,14 +148,34 @@ class UserRegistrationSerializer(UserCreateSerializer):
         )
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(FieldPlanMixin, serializers.Serializer):
+    """Изображение рецепта и его уменьшенные копии."""
+
+    image_srcset = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+
+    def get_image(self, obj):
+        return image_url(obj)
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj)
+
+    def get_thumbnail(self, obj):
+        return image_thumbnail(obj)
+
+
+class RecipeShortSerializer(RecipeImageSerializer,
+                            serializers.ModelSerializer):
     """Сериализатор для чтения рецептов (короткий)."""
 
-    image = serializers.ReadOnlyField(source='image.url')
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = (
+            'id', 'name', 'image', 'image_srcset', 'thumbnail',
+            'cooking_time',
+        )
 
 
 class SubscribeSerializer(CustomUserSerializer):
@@ -63,6 +190,8 @@ class SubscribeSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'latest_recipes'):
+            return RecipeShortSerializer(obj.latest_recipes, many=True).data
         request = self.context['request']
         limit = request.GET.get('recipes_limit')
         recipes = obj.recipes.all()
@@ -72,6 +201,8 @@ class SubscribeSerializer(CustomUserSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def validate(self, data):
@@ -91,7 +222,7 @@ class SubscribeSerializer(CustomUserSerializer):
         return data
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(FieldPlanMixin, serializers.ModelSerializer):
     """Сериализатор для модели ингредиентов."""
 
     class Meta:
@@ -105,7 +236,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(FieldPlanMixin,
+                                 serializers.ModelSerializer):
     """Сериализатор для чтения связующей модели рецептов и ингредиентов."""
 
     id = serializers.ReadOnlyField(source='ingredient.id')
@@ -120,14 +252,27 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('amount', 'id', 'name', 'measurement_unit')
 
 
+class ShoppingListItemSerializer(FieldPlanMixin,
+                                 serializers.ModelSerializer):
+    """Сериализатор для чтения сводного списка покупок."""
+
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit',
+    )
+    amount = serializers.IntegerField()
+
+    class Meta:
+        model = models.ShoppingListItem
+        fields = ('amount', 'id', 'name', 'measurement_unit')
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания записей в связующей модели
     рецептов и ингредиентов."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=models.Ingredient.objects.all(),
-        source='ingredient__id',
-    )
+    id = serializers.IntegerField(source='ingredient__id')
     amount = serializers.IntegerField(
         min_value=MIN_AMOUNT,
         max_value=MAX_AMOUNT
@@ -138,7 +283,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         fields = ('amount', 'id')
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(FieldPlanMixin, serializers.ModelSerializer):
     """Сериализатор для модели тегов."""
 
     class Meta:
@@ -146,7 +291,8 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(RecipeImageSerializer,
+                           serializers.ModelSerializer):
     """Сериализатор для чтения рецептов."""
 
     ingredients = RecipeIngredientSerializer(
@@ -155,41 +301,43 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
-    image = serializers.ReadOnlyField(source='image.url')
+    image = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Recipe
-        exclude = ('pub_date',)
+        exclude = (
+            'pub_date', 'favorites_count', 'carts_count', 'image_variants',
+            'search_vector', 'ingredient_ids', 'in_feeds',
+        )
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return bool(
-            self.context['request']
-            and user.is_authenticated
-            and obj.recipe.filter(user=user).exists()
-        )
+        relations = get_user_relations(self.context.get('request'))
+        return obj.pk in relations.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return bool(
-            self.context['request']
-            and user.is_authenticated
-            and obj.recipe_to_buy.filter(user_to_buy=user).exists()
-        )
+        relations = get_user_relations(self.context.get('request'))
+        return obj.pk in relations.shopping_cart
+
+
+class RecipeCoverageSerializer(RecipeReadSerializer):
+    """Рецепт с долей имеющихся ингредиентов и числом недостающих."""
+
+    coverage = serializers.FloatField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и редактирования рецептов."""
 
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=models.Tag.objects.all(),
         many=True,
     )
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = StreamedBase64ImageField()
     cooking_time = serializers.IntegerField(
         min_value=MIN_COOKING_TIME,
         max_value=MAX_COOKING_TIME
@@ -220,12 +368,20 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Список ингредиентов не может быть пустым.'
             )
-        ingredients = self.initial_data.get('ingredients')
-        ingredients_list = [ingredient['id'] for ingredient in ingredients]
+        ingredients_list = [
+            ingredient['ingredient__id'] for ingredient in data
+        ]
         if len(ingredients_list) != len(set(ingredients_list)):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться.'
             )
+        objects = get_objects_in_bulk(
+            models.Ingredient.objects.all(),
+            ingredients_list,
+            'Ингредиенты с id {pk_values} не существуют.',
+        )
+        for ingredient, obj in zip(data, objects):
+            ingredient['ingredient__id'] = obj
         return data
 
     @staticmethod
@@ -239,6 +395,46 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         models.RecipeIngredient.objects.bulk_create(data)
 
+    @staticmethod
+    def recipeingredient_update(recipe, ingredients):
+        """Применяет к ингредиентам рецепта только нужные изменения."""
+        amounts = {
+            ingredient['ingredient__id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {
+            item.ingredient_id: item
+            for item in models.RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        before = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        models.RecipeIngredient.objects.filter(
+            pk__in=[
+                item.pk for ingredient_id, item in current.items()
+                if ingredient_id not in amounts
+            ]
+        ).delete()
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = amounts.get(ingredient_id, item.amount)
+            if item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        models.RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        models.RecipeIngredient.objects.bulk_create(
+            models.RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        update_shopping_lists(recipe.pk, before, amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
         tags = validated_data.pop('tags')
@@ -248,16 +444,36 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.recipeingredient_create(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        models.RecipeTag.objects.filter(recipe=instance).delete()
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        models.RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.recipeingredient_create(instance, ingredients)
+        # Поля, которые меняются в обход сериализатора (счётчики через
+        # F(), рассылка и нарезка изображений), перечитываются из
+        # заблокированной строки, чтобы save() не затёр их
+        # значениями, загруженными до блокировки.
+        locked = models.Recipe.objects.select_for_update().filter(
+            pk=instance.pk
+        ).values(*RECIPE_SYSTEM_FIELDS).get()
+        for field, value in locked.items():
+            setattr(instance, field, value)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            self.recipeingredient_update(instance, ingredients)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipeingredient_set',
+                queryset=models.RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+            'tags',
+        )
         serializer = RecipeReadSerializer(
             instance,
             context={'request': self.context.get('request')}
@@ -0,0 +1,46 @@
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram_backend.db import check_connections
+from recipes.models import Favorite, Shopping_cart
+from users.models import CustomUser, Subscription
+from .authentication import forget_token
+from .relations import forget_relation
+
+
+@receiver(request_started)
+def check_persistent_connections(**kwargs):
+    check_connections()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def forget_user_tokens(instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        forget_token(key)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Shopping_cart)
+@receiver(post_save, sender=Subscription)
+def add_relation(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: forget_relation(instance))
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Shopping_cart)
+@receiver(post_delete, sender=Subscription)
+def remove_relation(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_relation(instance))
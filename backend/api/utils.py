@@ -0,0 +1,87 @@
+import csv
+from io import BytesIO
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from foodgram_backend.constants import (PDF_FONT_SIZE, PDF_MARGIN,
+                                        SHOPPING_CART_FILENAME,
+                                        SHOPPING_CART_TITLE)
+
+
+class Echo:
+    """Псевдобуфер: csv.writer сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_txt(buy_list):
+    yield f'{SHOPPING_CART_TITLE}\n\n'
+    for item in buy_list:
+        yield (
+            f'{item["name"]}, {item["amount"]} '
+            f'{item["measurement_unit"]}\n'
+        )
+
+
+def shopping_cart_csv(buy_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for item in buy_list:
+        yield writer.writerow(
+            (item['name'], item['amount'], item['measurement_unit'])
+        )
+
+
+def shopping_cart_pdf(buy_list):
+    if 'ShoppingCartFont' not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont('ShoppingCartFont', settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    line_height = PDF_FONT_SIZE * 1.5
+    y = height - PDF_MARGIN
+    pdf.setFont('ShoppingCartFont', PDF_FONT_SIZE)
+    for line in shopping_cart_txt(buy_list):
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont('ShoppingCartFont', PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        pdf.drawString(PDF_MARGIN, y, line.rstrip('\n'))
+        y -= line_height
+    pdf.save()
+    buffer.seek(0)
+    return buffer
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'pdf': (shopping_cart_pdf, 'application/pdf'),
+}
+
+
+def shopping_cart_response(buy_list, file_format):
+    """Отдаёт список покупок файлом, не собирая его целиком в памяти."""
+    generator, content_type = SHOPPING_CART_FORMATS[file_format]
+    filename = f'{SHOPPING_CART_FILENAME}.{file_format}'
+    if file_format == 'pdf':
+        return FileResponse(
+            generator(buy_list),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+    response = StreamingHttpResponse(
+        generator(buy_list),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
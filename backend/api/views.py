@@ -1,21 +1,38 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (BooleanField, Count, F, Prefetch, Value,
+                              Window)
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import exceptions, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 
+from foodgram_backend.constants import (AUTOCOMPLETE_LIMIT,
+                                        AUTOCOMPLETE_MAX_LIMIT, MAX_INTEGER,
+                                        RECIPE_CACHE_PARAMS,
+                                        WHAT_TO_COOK_MAX_INGREDIENTS)
+from recipes.cache import get_recipe_versions
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            Shopping_cart, Tag)
+                            Shopping_cart, ShoppingListItem, Tag)
 from users.models import CustomUser, Subscription
 from . import serializers
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPageNumberPagination
+from .filters import (IngredientFilter, RecipeFilter,
+                      autocomplete_ingredients, recipes_by_coverage)
+from .mixins import (AnonymousCacheMixin, AsyncActionsMixin,
+                     CachedCatalogueMixin, MetricsMixin)
+from .pagination import (CustomPageNumberPagination, FeedCursorPagination,
+                         RecipeCursorPagination)
+from .parsers import RecipeJSONParser
 from .permissions import IsAuthorOrReadOnlyPermission
+from .utils import SHOPPING_CART_FORMATS, shopping_cart_response
 
 
-class UserViewSet(mixins.ListModelMixin,
+class UserViewSet(MetricsMixin,
+                  mixins.ListModelMixin,
                   mixins.RetrieveModelMixin,
                   mixins.CreateModelMixin,
                   viewsets.GenericViewSet):
@@ -23,6 +40,12 @@ class UserViewSet(mixins.ListModelMixin,
     queryset = CustomUser.objects.all()
     serializer_class = serializers.CustomUserSerializer
     pagination_class = CustomPageNumberPagination
+    query_budgets = {
+        'list': 5,
+        'retrieve': 3,
+        'subscriptions': 4,
+        'subscribe': 10,
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -53,9 +76,11 @@ class UserViewSet(mixins.ListModelMixin,
             serializer = serializers.SubscriptionSerializer(data=data)
             serializer.is_valid(raise_exception=True)
             serializer.save()
-            second_serializer = serializers.SubscribeSerializer(
-                author,
-                context={'request': request},
+            second_serializer = self.measure_serializer(
+                serializers.SubscribeSerializer(
+                    author,
+                    context={'request': request},
+                )
             )
             return Response(
                 second_serializer.data,
@@ -82,78 +107,196 @@ class UserViewSet(mixins.ListModelMixin,
         permission_classes=(permissions.IsAuthenticated,),
     )
     def subscriptions(self, request):
-        user = self.request.user
-        user_subscriptions = user.subscriber.all()
-        authors = [item.author.id for item in user_subscriptions]
-        queryset = CustomUser.objects.filter(pk__in=authors)
-        paginated_queryset = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(paginated_queryset, many=True)
+        limit = request.query_params.get('recipes_limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise exceptions.ValidationError(
+                    {'recipes_limit': 'Введите целое число.'}
+                )
+        queryset = CustomUser.objects.filter(
+            pk__in=Subscription.objects.filter(
+                subscriber=request.user
+            ).values('author')
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('username')
+        authors = self.paginate_queryset(queryset)
+        self.attach_latest_recipes(authors, limit)
+        serializer = self.get_serializer(authors, many=True)
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def attach_latest_recipes(authors, limit):
+        """Последние рецепты всех авторов страницы одним запросом:
+        ROW_NUMBER() нумерует рецепты внутри каждого автора."""
+        if not authors:
+            return
+        recipes = Recipe.objects.filter(author__in=authors).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).order_by()
+        sql, params = recipes.query.sql_with_params()
+        if limit is None:
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) AS recipes '
+                'ORDER BY author_id, row_number',
+                params,
+            )
+        else:
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) AS recipes WHERE row_number <= %s '
+                'ORDER BY author_id, row_number',
+                (*params, limit),
+            )
+        latest_recipes = defaultdict(list)
+        for recipe in recipes:
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest_recipes[author.id]
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(AsyncActionsMixin, MetricsMixin,
+                        CachedCatalogueMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
+    query_budgets = {'list': 1, 'retrieve': 1, 'autocomplete': 2}
+    async_actions = ('list', 'retrieve')
 
+    def filter_catalogue(self, items):
+        name = self.request.query_params.get('name')
+        if not name:
+            return items
+        name = name.lower()
+        return [
+            item for item in items if item['name'].lower().startswith(name)
+        ]
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(
+        methods=['GET'],
+        url_path='autocomplete',
+        detail=False,
+    )
+    def autocomplete(self, request):
+        name = request.query_params.get('name', '').strip()
+        limit = request.query_params.get('limit', AUTOCOMPLETE_LIMIT)
+        try:
+            limit = min(int(limit), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            raise exceptions.ValidationError(
+                {'limit': 'Введите целое число.'}
+            )
+        if not name or limit < 1:
+            return Response([])
+        queryset = autocomplete_ingredients(self.queryset, name, limit)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class TagViewSet(AsyncActionsMixin, MetricsMixin, CachedCatalogueMixin,
+                 viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
+    query_budgets = {'list': 1, 'retrieve': 1}
+    async_actions = ('list', 'retrieve')
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncActionsMixin, MetricsMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnlyPermission,)
     http_method_names = ['get', 'post', 'patch', 'delete']
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipeCursorPagination
+    parser_classes = (RecipeJSONParser, FormParser, MultiPartParser)
+    query_budgets = {
+        'list': 6,
+        'retrieve': 5,
+        'what_to_cook': 6,
+        'feed': 6,
+        'create': 18,
+        'partial_update': 17,
+        'destroy': 11,
+        'favorite': 5,
+        'shopping_cart': 9,
+        'shopping_list': 1,
+        'download_shopping_cart': 1,
+    }
+    async_actions = ('retrieve', 'shopping_list', 'download_shopping_cart')
+    cache_params = RECIPE_CACHE_PARAMS
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация по умолчанию, постраничная — если в
+        запросе передан параметр page, а также для поиска, подбора
+        по ингредиентам и ordering=popular (у выдачи по релевантности
+        и числу добавлений в избранное нет ключа для курсора: курсор
+        DRF строится по первому полю сортировки). У ленты подписок —
+        своя курсорная пагинация."""
+        if not hasattr(self, '_paginator'):
+            page_query_param = CustomPageNumberPagination.page_query_param
+            query_params = self.request.query_params
+            if self.action == 'feed':
+                self._paginator = FeedCursorPagination()
+            elif (
+                self.action == 'what_to_cook'
+                or {page_query_param, 'search'} & set(query_params)
+                or query_params.get('ordering') == 'popular'
+            ):
+                self._paginator = CustomPageNumberPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """Отметки избранного, списка покупок и подписки на автора
+        сериализаторы берут из множеств связей пользователя."""
+        return Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+            'tags',
+        ).defer('search_vector', 'ingredient_ids')
+
+    def get_cache_versions(self):
+        if self.action == 'list':
+            return get_recipe_versions()
+        return get_recipe_versions(self.kwargs[self.lookup_field])
 
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return serializers.RecipeCreateSerializer
+        if self.action == 'what_to_cook':
+            return serializers.RecipeCoverageSerializer
         return serializers.RecipeReadSerializer
 
     @staticmethod
     def fav_or_shop_cart_post(serializer, data, recipe):
         serializer = serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         second_serializer = serializers.RecipeShortSerializer(recipe)
         return Response(
             second_serializer.data,
             status=status.HTTP_201_CREATED
         )
 
-    def save_to_text_file(self, buy_list):
-        final_buy_list = {}
-        for item in buy_list:
-            ingredient = Ingredient.objects.get(pk=item['ingredient'])
-            if ingredient in final_buy_list:
-                final_buy_list[ingredient] += item['amount']
-            else:
-                final_buy_list[ingredient] = item['amount']
-        sorted_final_buy_list = sorted(
-            final_buy_list.items(), key=lambda x: x[0].name
-        )
-
-        file_content = 'Foodgram. Список покупок.\n\n'
-        for item in sorted_final_buy_list:
-            ingredient = item[0]
-            amount = item[1]
-            file_content += (
-                f'{ingredient.name}, {amount} '
-                f'{ingredient.measurement_unit}\n'
-            )
-        response = HttpResponse(file_content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename=to_buy.txt'
-        return response
-
     @action(
         methods=['POST', 'DELETE'],
         url_path='favorite',
@@ -216,6 +359,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['GET'],
+        url_path='shopping_list',
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def shopping_list(self, request):
+        """Сводный список покупок: ингредиенты всех рецептов из списка
+        покупок с суммарным количеством."""
+        items = ShoppingListItem.objects.filter(
+            user=request.user, amount__gt=0
+        ).select_related('ingredient').order_by(
+            'ingredient__name', 'ingredient__measurement_unit'
+        )
+        serializer = serializers.ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
     @action(
         methods=['GET'],
         url_path='download_shopping_cart',
@@ -223,11 +383,78 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(permissions.IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
-        shopping_cart = Shopping_cart.objects.filter(
-            user_to_buy=self.request.user
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_CART_FORMATS:
+            formats = ', '.join(SHOPPING_CART_FORMATS)
+            raise exceptions.ValidationError(
+                {'file_format': f'Доступные форматы: {formats}.'}
+            )
+        buy_list = ShoppingListItem.objects.filter(
+            user=request.user, amount__gt=0
+        ).values(
+            'amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        ).order_by('name', 'measurement_unit')
+        return shopping_cart_response(buy_list.iterator(), file_format)
+
+    @action(
+        methods=['GET'],
+        url_path='what_to_cook',
+        detail=False,
+    )
+    def what_to_cook(self, request):
+        """Рецепты по доле ингредиентов из переданного списка."""
+        try:
+            ingredients = list(dict.fromkeys(
+                int(pk) for pk in request.query_params.getlist('ingredients')
+            ))
+        except ValueError:
+            ingredients = None
+        if ingredients is None or not all(
+            0 < pk <= MAX_INTEGER for pk in ingredients
+        ):
+            raise exceptions.ValidationError(
+                {'ingredients': 'Передайте id ингредиентов.'}
+            )
+        if not ingredients:
+            raise exceptions.ValidationError(
+                {'ingredients': 'Список ингредиентов не может быть пустым.'}
+            )
+        if len(ingredients) > WHAT_TO_COOK_MAX_INGREDIENTS:
+            raise exceptions.ValidationError({
+                'ingredients': 'Не больше '
+                f'{WHAT_TO_COOK_MAX_INGREDIENTS} ингредиентов.'
+            })
+        max_missing = request.query_params.get('max_missing')
+        if max_missing is not None:
+            try:
+                max_missing = int(max_missing)
+            except ValueError:
+                raise exceptions.ValidationError(
+                    {'max_missing': 'Введите целое число.'}
+                )
+            if max_missing < 0:
+                raise exceptions.ValidationError(
+                    {'max_missing': 'Значение не может быть отрицательным.'}
+                )
+        queryset = recipes_by_coverage(
+            self.filter_queryset(self.get_queryset()),
+            ingredients,
+            max_missing,
         )
-        recipes = [item.recipe_to_buy.id for item in shopping_cart]
-        buy_list = RecipeIngredient.objects.filter(
-            recipe__in=recipes
-        ).values('ingredient').annotate(amount=Sum('amount'))
-        return self.save_to_text_file(buy_list)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        url_path='feed',
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,166 @@
+import json
+import os
+import random
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmark.runner import (SCENARIOS, BenchmarkData, Runner, compare,
+                              summarize)
+from benchmark.seed import Seeder
+from recipes.images import get_executor
+from recipes.models import Recipe
+
+COLUMNS = ('requests', 'errors', 'rps', 'p50', 'p95', 'p99', 'queries',
+           'max_queries')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест API на одноразовой базе PostgreSQL: наполнение '
+        'данными, прогон ключевых запросов и сравнение с базовым прогоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(
+                settings.BASE_DIR.parent, 'data', 'ingredients.json'
+            ),
+            help='Справочник ингредиентов (CSV или JSON)',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Зерно генератора данных и запросов',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов на сценарий',
+        )
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Запустить только указанные сценарии',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(
+                settings.BASE_DIR, 'benchmark', 'baseline.json'
+            ),
+            help='Файл с результатами базового прогона',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Записать результаты в файл базового прогона',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 относительно базового прогона',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Завершаться ошибкой при регрессии',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Не удалять тестовую базу, чтобы не наполнять её заново',
+        )
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нагрузочный тест требует PostgreSQL.')
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST']['NAME'] = f'benchmark_{old_name}'
+        connection.creation.create_test_db(
+            verbosity=0,
+            autoclobber=True,
+            serialize=False,
+            keepdb=options['keepdb'],
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    MEDIA_ROOT=media_root,
+                ):
+                    self.benchmark(options)
+                    get_executor().shutdown(wait=True)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+
+    def benchmark(self, options):
+        if Recipe.objects.count() < options['recipes']:
+            Seeder(
+                random.Random(options['seed']),
+                options['recipes'],
+                options['users'],
+                options['ingredients'],
+                self.log,
+            ).run()
+        data = BenchmarkData()
+        runner = Runner(options['concurrency'])
+        rng = random.Random(options['seed'])
+        summary = {}
+        for name in options['scenario'] or SCENARIOS:
+            build = SCENARIOS[name]
+            runner.run(build(rng, data) for _ in range(options['warmup']))
+            results, elapsed = runner.run(
+                build(rng, data) for _ in range(options['requests'])
+            )
+            summary[name] = summarize(results, elapsed)
+        self.report(summary)
+        self.compare(summary, options)
+
+    def report(self, summary):
+        width = max(map(len, summary)) + 2
+        self.stdout.write(
+            'сценарий'.ljust(width)
+            + ''.join(column.rjust(12) for column in COLUMNS)
+        )
+        for name, result in summary.items():
+            self.stdout.write(
+                name.ljust(width)
+                + ''.join(str(result[column]).rjust(12) for column in COLUMNS)
+            )
+        self.stdout.write('Время в мс, queries — среднее на запрос.')
+
+    def compare(self, summary, options):
+        path = options['baseline']
+        if options['save_baseline']:
+            with open(path, 'w', encoding='utf8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовый прогон сохранён в {path}'
+            ))
+            return
+        if not os.path.exists(path):
+            self.stdout.write(f'Базовый прогон {path} не найден.')
+            return
+        with open(path, 'r', encoding='utf8') as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, options['tolerance'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                'Регрессий относительно базового прогона нет'
+            ))
+            return
+        message = '\n'.join(regressions)
+        if options['fail_on_regression']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,257 @@
+import queue
+import statistics
+import threading
+from contextlib import ExitStack
+from time import perf_counter
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from api.metrics import RequestMetrics
+from recipes.models import Ingredient, Recipe, Shopping_cart, Tag
+from users.models import Subscription
+
+BENCHMARK_IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+class BenchmarkData:
+    """Выборка из наполненной базы, из которой собираются запросы."""
+
+    def __init__(self, sample_size=1000):
+        self.tokens = dict(
+            Token.objects.filter(
+                user__username__startswith='bench'
+            ).values_list('user_id', 'key')
+        )
+        self.users = list(self.tokens)[:sample_size]
+        self.cart_users = self.sample_users(
+            Shopping_cart.objects.values_list('user_to_buy_id', flat=True),
+            sample_size,
+        )
+        self.subscribers = self.sample_users(
+            Subscription.objects.values_list('subscriber_id', flat=True),
+            sample_size,
+        )
+        self.author_ids = list(
+            Recipe.objects.order_by('author_id').values_list(
+                'author_id', flat=True
+            ).distinct()[:sample_size]
+        )
+        self.tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('pk', flat=True)
+        )
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)
+        )
+
+    def sample_users(self, user_ids, sample_size):
+        return [
+            user_id
+            for user_id in user_ids.order_by().distinct()[:sample_size]
+            if user_id in self.tokens
+        ]
+
+    def token(self, user_id):
+        return self.tokens[user_id]
+
+
+def recipes(rng, data):
+    return 'get', '/api/recipes/', None, None
+
+
+def recipes_filtered(rng, data):
+    params = [
+        ('tags', slug)
+        for slug in rng.sample(data.tag_slugs, rng.randint(1, 2))
+    ]
+    token = None
+    choice = rng.random()
+    if choice < 0.3:
+        params.append(('author', rng.choice(data.author_ids)))
+    elif choice < 0.6:
+        params.append(('is_favorited', 1))
+        token = data.token(rng.choice(data.users))
+    elif choice < 0.8:
+        params.append(('is_in_shopping_cart', 1))
+        token = data.token(rng.choice(data.cart_users))
+    return 'get', f'/api/recipes/?{urlencode(params)}', None, token
+
+
+def ingredients(rng, data):
+    name = rng.choice(data.ingredient_names)[:rng.randint(1, 3)]
+    return 'get', f'/api/ingredients/?{urlencode({"name": name})}', None, None
+
+
+def ingredients_autocomplete(rng, data):
+    """Подсказки по началу, середине названия и с опечаткой."""
+    name = rng.choice(data.ingredient_names)
+    kind = rng.randrange(3)
+    if kind == 0:
+        term = name[:rng.randint(2, 5)]
+    elif kind == 1 and len(name) > 4:
+        start = rng.randrange(1, len(name) - 3)
+        term = name[start:start + 3]
+    else:
+        position = rng.randrange(len(name))
+        term = name[:position] + name[position + 1:]
+    return (
+        'get',
+        f'/api/ingredients/autocomplete/?{urlencode({"name": term})}',
+        None,
+        None,
+    )
+
+
+def subscriptions(rng, data):
+    return (
+        'get',
+        '/api/users/subscriptions/?recipes_limit=3',
+        None,
+        data.token(rng.choice(data.subscribers)),
+    )
+
+
+def download_shopping_cart(rng, data):
+    return (
+        'get',
+        '/api/recipes/download_shopping_cart/',
+        None,
+        data.token(rng.choice(data.cart_users)),
+    )
+
+
+def recipe_create(rng, data):
+    body = {
+        'ingredients': [
+            {'id': pk, 'amount': rng.randint(1, 500)}
+            for pk in rng.sample(data.ingredient_ids, rng.randint(3, 12))
+        ],
+        'tags': rng.sample(data.tag_ids, rng.randint(1, 3)),
+        'image': BENCHMARK_IMAGE,
+        'name': f'Рецепт для нагрузочного теста {rng.randrange(10 ** 9)}',
+        'text': 'Смешать и подавать.',
+        'cooking_time': rng.randint(5, 180),
+    }
+    return 'post', '/api/recipes/', body, data.token(rng.choice(data.users))
+
+
+SCENARIOS = {
+    'recipes': recipes,
+    'recipes_filtered': recipes_filtered,
+    'ingredients': ingredients,
+    'ingredients_autocomplete': ingredients_autocomplete,
+    'subscriptions': subscriptions,
+    'download_shopping_cart': download_shopping_cart,
+    'recipe_create': recipe_create,
+}
+
+
+class Runner:
+    """Прогоняет запросы через WSGIHandler в несколько потоков без сети.
+
+    Обработка запроса идёт тем же путём, что и под gunicorn, включая
+    сигналы начала и конца запроса, потоковые ответы читаются целиком.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.handler = WSGIHandler()
+        self.factory = APIRequestFactory()
+
+    def build_environ(self, method, path, body, token):
+        extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        if body is None:
+            request = getattr(self.factory, method)(path, **extra)
+        else:
+            request = getattr(self.factory, method)(
+                path, body, format='json', **extra
+            )
+        return request.environ
+
+    def perform(self, environ):
+        metrics = RequestMetrics()
+        started = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.record_query)
+                )
+            response = self.handler(environ, lambda *args: None)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+        return perf_counter() - started, metrics.queries, response.status_code
+
+    def worker(self, environs, results):
+        try:
+            while True:
+                try:
+                    environ = environs.get_nowait()
+                except queue.Empty:
+                    return
+                results.append(self.perform(environ))
+        finally:
+            connections.close_all()
+
+    def run(self, requests):
+        environs = queue.Queue()
+        for request in requests:
+            environs.put(self.build_environ(*request))
+        results = []
+        threads = [
+            threading.Thread(target=self.worker, args=(environs, results))
+            for _ in range(self.concurrency)
+        ]
+        started = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, perf_counter() - started
+
+
+def summarize(results, elapsed):
+    latencies = [latency * 1000 for latency, _, _ in results]
+    queries = [count for _, count, _ in results]
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(results),
+        'errors': sum(status >= 400 for _, _, status in results),
+        'rps': round(len(results) / elapsed, 1),
+        'p50': round(percentiles[49], 2),
+        'p95': round(percentiles[94], 2),
+        'p99': round(percentiles[98], 2),
+        'queries': round(statistics.mean(queries), 1),
+        'max_queries': max(queries),
+    }
+
+
+def compare(summary, baseline, tolerance):
+    """Регрессии относительно базового прогона: p95 выросло больше
+    чем на tolerance или запросов к БД стало больше."""
+    regressions = []
+    for name, result in summary.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {result["p95"]} мс, '
+                f'в базовом прогоне {base["p95"]} мс'
+            )
+        if result['max_queries'] > base['max_queries']:
+            regressions.append(
+                f'{name}: до {result["max_queries"]} запросов к БД, '
+                f'в базовом прогоне {base["max_queries"]}'
+            )
+    return regressions
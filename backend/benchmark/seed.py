@@ -0,0 +1,212 @@
+import io
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+
+from foodgram_backend.constants import IMPORT_BATCH_SIZE
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, Shopping_cart, Tag)
+from users.models import CustomUser, Subscription
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+BENCHMARK_TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Десерт', 'dessert', '#F5B041'),
+    ('Выпечка', 'bakery', '#A04000'),
+    ('Вегетарианское', 'vegetarian', '#1ABC9C'),
+)
+
+
+def zipf_cum_weights(count, exponent=1.0):
+    """Накопленные веса закона Ципфа: первый элемент самый популярный."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def skewed_count(rng, mean, limit):
+    """Количество с тяжёлым хвостом (распределение Парето)
+    и заданным средним."""
+    return min(int(rng.paretovariate(1.5) * mean / 3), limit)
+
+
+def skewed_sample(rng, population, cum_weights, count):
+    return set(rng.choices(population, cum_weights=cum_weights, k=count))
+
+
+class Seeder:
+    """Наполняет базу воспроизводимым набором данных: полный справочник
+    ингредиентов, пользователи, рецепты и перекошенные графы избранного,
+    списков покупок и подписок."""
+
+    def __init__(self, rng, recipes, users, ingredients_path, log):
+        self.rng = rng
+        self.recipes = recipes
+        self.users = users
+        self.ingredients_path = ingredients_path
+        self.log = log
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True
+        )
+
+    def seed_ingredients(self):
+        call_command(
+            'import_data', self.ingredients_path, stdout=io.StringIO()
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        self.rng.shuffle(self.ingredient_ids)
+        self.ingredient_weights = zipf_cum_weights(len(self.ingredient_ids))
+        self.log(f'Ингредиентов: {len(self.ingredient_ids)}')
+
+    def seed_tags(self):
+        self.bulk_create(Tag, (
+            Tag(name=name, slug=slug, color=color)
+            for name, slug, color in BENCHMARK_TAGS
+        ))
+        self.tag_ids = list(Tag.objects.values_list('pk', flat=True))
+
+    def seed_users(self):
+        password = make_password(BENCHMARK_PASSWORD)
+        self.bulk_create(CustomUser, (
+            CustomUser(
+                username=f'bench{number}',
+                email=f'bench{number}@foodgram.ru',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(self.users)
+        ))
+        self.user_ids = list(
+            CustomUser.objects.filter(
+                username__startswith='bench'
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        self.bulk_create(Token, (
+            Token(key=Token.generate_key(), user_id=user_id)
+            for user_id in self.user_ids
+        ))
+        self.log(f'Пользователей: {len(self.user_ids)}')
+
+    def seed_recipes(self):
+        authors = self.user_ids[:]
+        self.rng.shuffle(authors)
+        author_weights = zipf_cum_weights(len(authors))
+        names = dict(Ingredient.objects.values_list('pk', 'name'))
+        for start in range(0, self.recipes, IMPORT_BATCH_SIZE):
+            size = min(IMPORT_BATCH_SIZE, self.recipes - start)
+            compositions = [
+                skewed_sample(
+                    self.rng, self.ingredient_ids, self.ingredient_weights,
+                    self.rng.randint(3, 12),
+                )
+                for _ in range(size)
+            ]
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        name=(
+                            f'{names[min(composition)].capitalize()} '
+                            f'№{start + number}'
+                        ),
+                        text='Смешать: ' + ', '.join(
+                            names[pk] for pk in composition
+                        ) + '.',
+                        author_id=self.rng.choices(
+                            authors, cum_weights=author_weights
+                        )[0],
+                        image='recipes/images/benchmark.png',
+                        cooking_time=self.rng.randint(5, 180),
+                    )
+                    for number, composition in enumerate(compositions)
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe=recipe,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500),
+                    )
+                    for recipe, composition in zip(recipes, compositions)
+                    for ingredient_id in composition
+                )
+                RecipeTag.objects.bulk_create(
+                    RecipeTag(recipe=recipe, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in self.rng.sample(
+                        self.tag_ids, self.rng.randint(1, 3)
+                    )
+                )
+            self.log(f'Рецептов: {start + size} из {self.recipes}')
+        table = Recipe._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET pub_date = now() - '
+                f"((SELECT max(id) FROM {table}) - id) * interval '1 minute'"
+            )
+
+    def seed_relations(self):
+        recipe_ids = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        self.rng.shuffle(recipe_ids)
+        recipe_weights = zipf_cum_weights(len(recipe_ids))
+        authors = list(
+            Recipe.objects.order_by('author_id').values_list(
+                'author_id', flat=True
+            ).distinct()
+        )
+        self.rng.shuffle(authors)
+        author_weights = zipf_cum_weights(len(authors))
+        favorites, carts, subscriptions = [], [], []
+        for user_id in self.user_ids:
+            favorites.extend(
+                Favorite(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in skewed_sample(
+                    self.rng, recipe_ids, recipe_weights,
+                    skewed_count(self.rng, 20, 1000),
+                )
+            )
+            carts.extend(
+                Shopping_cart(user_to_buy_id=user_id, recipe_to_buy_id=pk)
+                for pk in skewed_sample(
+                    self.rng, recipe_ids, recipe_weights,
+                    skewed_count(self.rng, 8, 200),
+                )
+            )
+            subscriptions.extend(
+                Subscription(subscriber_id=user_id, author_id=author_id)
+                for author_id in skewed_sample(
+                    self.rng, authors, author_weights,
+                    skewed_count(self.rng, 10, 500),
+                )
+                if author_id != user_id
+            )
+        for model, objects in (
+            (Favorite, favorites),
+            (Shopping_cart, carts),
+            (Subscription, subscriptions),
+        ):
+            self.bulk_create(model, objects)
+            self.log(f'{model._meta.verbose_name_plural}: {len(objects)}')
+
+    def run(self):
+        self.seed_ingredients()
+        self.seed_tags()
+        self.seed_users()
+        self.seed_recipes()
+        self.seed_relations()
+        call_command('sync_counters', stdout=io.StringIO())
+        call_command('backfill_feed', '--rebuild', stdout=io.StringIO())
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
@@ -8,6 +8,24 @@ USERNAME_LENGHT = 150
 
 PAGE_SIZE = 6
 
+MAX_PAGE_SIZE = 100
+
+RECIPE_ORDERING = ('-pub_date', '-id')
+
+POPULAR_RECIPE_ORDERING = ('-favorites_count',) + RECIPE_ORDERING
+
+RECIPE_CACHE_PARAMS = ('author', 'cursor', 'limit', 'page', 'tags')
+
+SEARCH_CONFIG = 'russian'
+
+WHAT_TO_COOK_MAX_INGREDIENTS = 100
+
+MAX_INTEGER = 2 ** 31 - 1
+
+FEED_BACKFILL_LIMIT = 100
+
+FEED_BATCH_SIZE = 1000
+
 RESERVED_USERNAMES = ['me']
 
 MIN_AMOUNT = MIN_COOKING_TIME = 1
@@ -15,3 +33,37 @@ MIN_AMOUNT = MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 3000
 
 MAX_AMOUNT = 10000
+
+SHOPPING_CART_FILENAME = 'to_buy'
+
+SHOPPING_CART_TITLE = 'Foodgram. Список покупок.'
+
+PDF_FONT_SIZE = 12
+
+PDF_MARGIN = 50
+
+IMPORT_BATCH_SIZE = 1000
+
+AUTOCOMPLETE_LIMIT = 10
+
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+IMAGE_VARIANTS_PATH = 'recipes/images/variants/'
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+
+IMAGE_VARIANT_FORMATS = (('JPEG', 'jpg'), ('WEBP', 'webp'))
+
+IMAGE_QUALITY = 80
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+BASE64_HEADER_LENGTH = 100
+
+FILE_SIGNATURE_LENGTH = 2048
+
+MEDIA_URL_CACHE_SIZE = 10000
+
+METRICS_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
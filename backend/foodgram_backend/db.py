@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Модели, которые читаются только из основной базы: токен, выданный
+# при входе, должен работать сразу, не дожидаясь реплики.
+PRIMARY_MODELS = {'authtoken.token'}
+
+REPLICA_PIN_KEY = 'replica-pin:{}'
+
+_read_database = ContextVar('read_database', default=None)
+
+
+@contextmanager
+def read_from(alias):
+    """Направляет чтение в базу alias до выхода из блока.
+
+    Значение хранится в contextvars и доходит до потоков, в которых
+    выполняются представления под ASGI.
+    """
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение внутри read_from идёт в выбранную реплику, запись,
+    миграции и остальное чтение — в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def check_connections():
+    """Закрывает постоянные соединения потока, которые перестали
+    отвечать, например после перезапуска PostgreSQL или pgbouncer.
+
+    В Django 3.2 нет CONN_HEALTH_CHECKS, проверка включается
+    одноимённым ключом в настройках базы и стоит запроса к каждой
+    открытой базе, поэтому по умолчанию выключена: соединение
+    с ошибкой Django и так закрывает в конце запроса.
+    """
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not connection.is_usable()
+        ):
+            connection.close()
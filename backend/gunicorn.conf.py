@@ -0,0 +1,12 @@
+import os
+
+# SERVER_MODE=asgi запускает приложение ASGI на воркерах uvicorn,
+# по умолчанию — WSGI на синхронных воркерах. Количество воркеров
+# gunicorn берёт из переменной WEB_CONCURRENCY.
+bind = '0.0.0.0:8000'
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'foodgram_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_backend.wsgi:application'
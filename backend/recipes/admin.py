@@ -1,9 +1,14 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.db import transaction
 from rest_framework.authtoken.models import TokenProxy
 
+from .cache import bump_recipe_versions
 from .models import (Ingredient, Favorite, Recipe, RecipeIngredient,
                      RecipeTag, Shopping_cart, Tag)
+from .shopping_list import tracking_shopping_lists
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -18,6 +23,32 @@ class RecipeTagInline(admin.TabularInline):
     extra = 1
 
 
+class RecipePartAdmin(admin.ModelAdmin):
+    """Изменения ингредиентов и тегов рецептов сбрасывают кэш ответов
+    с этими рецептами."""
+
+    @contextmanager
+    def changing_recipes(self, recipe_ids):
+        yield
+        transaction.on_commit(lambda: bump_recipe_versions(recipe_ids))
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.add(form.initial['recipe'])
+        with self.changing_recipes(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with self.changing_recipes([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        with self.changing_recipes(recipe_ids):
+            super().delete_queryset(request, queryset)
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = [
@@ -25,18 +56,18 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'author',
         'pub_date',
-        'is_favorited_sum',
+        'favorites_count',
+        'carts_count',
     ]
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
+    readonly_fields = ('favorites_count', 'carts_count')
     inlines = (RecipeTagInline, RecipeIngredientInline)
 
-    def is_favorited_sum(self, request):
-        current_recipe_is_favorited = Favorite.objects.filter(
-            recipe__id=request.id)
-        is_favorited_sum = len(current_recipe_is_favorited)
-        return is_favorited_sum
+    def save_related(self, request, form, formsets, change):
+        with tracking_shopping_lists([form.instance.pk]):
+            super().save_related(request, form, formsets, change)
 
 
 @admin.register(Ingredient)
@@ -48,12 +79,20 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(RecipePartAdmin):
     list_display = ['recipe', 'ingredient', 'amount']
     search_fields = ('recipe', 'ingredient')
     list_filter = ('recipe', 'ingredient')
+    ordering = ('recipe',)
     empty_value_display = '-пусто-'
 
+    @contextmanager
+    def changing_recipes(self, recipe_ids):
+        with super().changing_recipes(recipe_ids), tracking_shopping_lists(
+            recipe_ids
+        ):
+            yield
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -62,21 +101,24 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(RecipeTag)
-class RecipeTagAdmin(admin.ModelAdmin):
+class RecipeTagAdmin(RecipePartAdmin):
     list_display = ['recipe', 'tag']
     list_filter = ('tag',)
+    ordering = ('recipe',)
     empty_value_display = '-пусто-'
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'recipe']
+    ordering = ('user__username',)
     empty_value_display = '-пусто-'
 
 
 @admin.register(Shopping_cart)
 class Shopping_cartAdmin(admin.ModelAdmin):
     list_display = ['user_to_buy', 'recipe_to_buy']
+    ordering = ('user_to_buy__username',)
     empty_value_display = '-пусто-'
 
 
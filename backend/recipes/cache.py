@@ -0,0 +1,70 @@
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'catalogue:{}:version'
+
+RECIPES_VERSION_KEY = 'recipes:version'
+RECIPE_LIST_VERSION_KEY = 'recipes:list:version'
+RECIPE_VERSION_KEY = 'recipe:{}:version'
+
+
+def get_catalogue_version(model):
+    """Версия каталога — время последнего известного изменения модели."""
+    key = CATALOGUE_VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = time()
+        if not cache.add(key, version, settings.CATALOGUE_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_catalogue_version(model):
+    cache.set(
+        CATALOGUE_VERSION_KEY.format(model._meta.label_lower),
+        time(),
+        settings.CATALOGUE_CACHE_TIMEOUT,
+    )
+
+
+def get_recipe_versions(recipe_id=None):
+    """Версии, от которых зависит ответ со списком рецептов
+    (recipe_id=None) или с одним рецептом.
+
+    Общая версия меняется вместе с тегами и ингредиентами, версия
+    списка — при любом изменении рецептов, версия рецепта — при
+    изменении рецепта, его тегов, ингредиентов и автора.
+    """
+    keys = [RECIPES_VERSION_KEY]
+    if recipe_id is None:
+        keys.append(RECIPE_LIST_VERSION_KEY)
+    else:
+        keys.append(RECIPE_VERSION_KEY.format(recipe_id))
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time()
+            if not cache.add(key, version, settings.RECIPE_CACHE_TIMEOUT):
+                version = cache.get(key, version)
+            versions[key] = version
+    return tuple(versions[key] for key in keys)
+
+
+def bump_recipe_versions(recipe_ids):
+    version = time()
+    cache.set_many(
+        {
+            RECIPE_LIST_VERSION_KEY: version,
+            **{
+                RECIPE_VERSION_KEY.format(recipe_id): version
+                for recipe_id in recipe_ids
+            },
+        },
+        settings.RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def bump_recipes_version():
+    cache.set(RECIPES_VERSION_KEY, time(), settings.RECIPE_CACHE_TIMEOUT)
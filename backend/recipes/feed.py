@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import transaction
+
+from foodgram_backend.constants import (FEED_BACKFILL_LIMIT, FEED_BATCH_SIZE,
+                                        RECIPE_ORDERING)
+from users.models import Subscription
+from .models import FeedItem, Recipe
+
+
+def fan_out(author_id, recipe_ids=None):
+    """Рассылает ещё не разосланные рецепты автора по лентам его
+    подписчиков (fan-out on write).
+
+    Рецепты авторов, у которых подписчиков больше
+    FEED_FANOUT_MAX_FOLLOWERS, не рассылаются: они попадают в ленту
+    при чтении. Возвращает количество разосланных рецептов.
+    """
+    subscribers = list(
+        Subscription.objects.filter(author_id=author_id).values_list(
+            'subscriber_id', flat=True
+        )[:settings.FEED_FANOUT_MAX_FOLLOWERS + 1]
+    )
+    if len(subscribers) > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return 0
+    recipes = Recipe.objects.filter(author_id=author_id, in_feeds=False)
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    with transaction.atomic():
+        recipes = list(
+            recipes.select_for_update().values_list('pk', 'pub_date')
+        )
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in recipes
+                for user_id in subscribers
+            ),
+            batch_size=FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        Recipe.objects.filter(
+            pk__in=[recipe_id for recipe_id, _ in recipes]
+        ).update(in_feeds=True)
+    return len(recipes)
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту последние разосланные рецепты автора,
+    на которого подписался пользователь."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id, in_feeds=True
+    ).order_by(*RECIPE_ORDERING).values_list('pk', 'pub_date')
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in recipes[:FEED_BACKFILL_LIMIT]
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def feed_recipe_ids(user, position=None, reverse=False, limit=None):
+    """Id рецептов ленты пользователя после позиции курсора.
+
+    Разосланные рецепты берутся из FeedItem, остальные (популярных
+    авторов и ещё не разосланные) — из Recipe по частичному индексу
+    (fan-out on read). Обе части ограничиваются limit и
+    объединяются через UNION, который убирает повторы.
+    """
+    direction = '' if reverse else '-'
+    date_lookup = 'pub_date__gt' if reverse else 'pub_date__lt'
+    timeline = FeedItem.objects.filter(user=user)
+    on_read = Recipe.objects.filter(
+        in_feeds=False,
+        author__in=Subscription.objects.filter(
+            subscriber=user
+        ).values('author'),
+    )
+    if position is not None:
+        timeline = timeline.filter(**{date_lookup: position})
+        on_read = on_read.filter(**{date_lookup: position})
+    timeline = timeline.order_by(
+        f'{direction}pub_date', f'{direction}recipe_id'
+    ).values_list('recipe_id', 'pub_date')[:limit]
+    on_read = on_read.order_by(
+        f'{direction}pub_date', f'{direction}id'
+    ).values_list('id', 'pub_date')[:limit]
+    feed = timeline.union(on_read).order_by(
+        f'{direction}pub_date', f'{direction}recipe_id'
+    )[:limit]
+    return [recipe_id for recipe_id, _ in feed]
@@ -0,0 +1,122 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+from foodgram_backend.constants import (IMAGE_QUALITY, IMAGE_VARIANT_FORMATS,
+                                        IMAGE_VARIANT_WIDTHS,
+                                        IMAGE_VARIANTS_PATH,
+                                        MEDIA_URL_CACHE_SIZE)
+from .cache import bump_recipe_versions
+from .models import Recipe
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def schedule_image_variants(recipe_id):
+    """Ставит нарезку изображения рецепта в фоновый пул потоков."""
+    get_executor().submit(build_image_variants_task, recipe_id)
+
+
+def build_image_variants_task(recipe_id):
+    try:
+        build_image_variants(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def resize(image, width):
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def build_image_variants(recipe_id):
+    """Сохраняет уменьшенные копии изображения в JPEG и WebP
+    и записывает их имена в Recipe.image_variants."""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    with recipe.image.open('rb') as image_file:
+        image = ImageOps.exif_transpose(Image.open(image_file))
+        image = image.convert('RGB')
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    for width in IMAGE_VARIANT_WIDTHS:
+        resized = resize(image, width)
+        for image_format, extension in IMAGE_VARIANT_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=IMAGE_QUALITY)
+            name = default_storage.save(
+                f'{IMAGE_VARIANTS_PATH}{stem}_{resized.width}.{extension}',
+                ContentFile(buffer.getvalue()),
+            )
+            variants.setdefault(extension, {})[str(resized.width)] = name
+        if resized is image:
+            break
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants
+    )
+    if updated:
+        bump_recipe_versions([recipe_id])
+    stale = variants if not updated else recipe.image_variants
+    delete_image_variants(stale)
+
+
+def delete_image_variants(variants):
+    for extension, files in variants.items():
+        if extension == 'source':
+            continue
+        for name in files.values():
+            default_storage.delete(name)
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def media_url(name):
+    """URL файла в хранилище. Кэшируется: FileSystemStorage.url
+    на каждый вызов разбирает адрес через urljoin."""
+    return default_storage.url(name)
+
+
+def image_url(recipe):
+    """То же, что recipe.image.url, но через кэш media_url."""
+    if not recipe.image:
+        return recipe.image.url
+    return media_url(recipe.image.name)
+
+
+def image_srcset(recipe):
+    """srcset для каждого формата: {'webp': 'url 320w, url 640w', ...}."""
+    return {
+        extension: ', '.join(
+            f'{media_url(name)} {width}w' for width, name in files.items()
+        )
+        for extension, files in recipe.image_variants.items()
+        if extension != 'source'
+    }
+
+
+def image_thumbnail(recipe):
+    """Самая маленькая WebP-копия или исходное изображение."""
+    files = recipe.image_variants.get('webp')
+    if not files:
+        return image_url(recipe)
+    return media_url(files[min(files, key=int)])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import fan_out
+from recipes.models import FeedItem, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Заполнение лент подписок неразосланными рецептами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Очистить ленты и разослать все рецепты заново',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with transaction.atomic():
+                FeedItem.objects.all().delete()
+                Recipe.objects.update(in_feeds=False)
+        author_ids = list(
+            Recipe.objects.filter(in_feeds=False).order_by().values_list(
+                'author_id', flat=True
+            ).distinct()
+        )
+        sent = 0
+        for number, author_id in enumerate(author_ids, 1):
+            sent += fan_out(author_id)
+            self.stdout.write(f'Обработано {number} из {len(author_ids)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Разослано {sent} рецептов, рецепты популярных авторов '
+            'попадут в ленту при чтении'
+        ))
@@ -1,12 +1,20 @@
 import csv
+import io
+import json
+import os
+from collections import Counter
+from time import monotonic
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from foodgram_backend.constants import IMPORT_BATCH_SIZE
+from recipes.cache import bump_catalogue_version
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
-    help = 'Импорт данных из csv файлов'
+    help = 'Импорт ингредиентов из csv или json файла'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -14,15 +22,139 @@ class Command(BaseCommand):
             type=str,
             nargs='?',
             default='/app/recipes/data/ingredients.csv',
-            help='Путь до CSV файла',
+            help='Путь до CSV или JSON файла',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Количество строк в одном INSERT',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загрузка через COPY во временную таблицу (PostgreSQL)',
+        )
+        parser.add_argument(
+            '--update-units',
+            action='store_true',
+            help=(
+                'Обновлять единицу измерения, если ингредиент с таким '
+                'названием уже есть в базе в единственном экземпляре'
+            ),
+        )
+
+    @staticmethod
+    def read_rows(path):
+        with open(path, 'r', encoding='utf8') as f:
+            if os.path.splitext(path)[1].lower() == '.json':
+                rows = (
+                    (item['name'], item['measurement_unit'])
+                    for item in json.load(f)
+                )
+            else:
+                rows = (tuple(row[:2]) for row in csv.reader(f) if row)
+            return list(dict.fromkeys(
+                (name.strip(), unit.strip()) for name, unit in rows
+            ))
+
+    @staticmethod
+    def single_unit_names(rows):
+        """Названия, у которых в файле ровно одна единица измерения."""
+        names_count = Counter(name for name, _ in rows)
+        return {
+            name: unit for name, unit in rows if names_count[name] == 1
+        }
+
+    def update_units(self, rows):
+        units = self.single_unit_names(rows)
+        candidates = Ingredient.objects.filter(name__in=units)
+        names_count = Counter(candidates.values_list('name', flat=True))
+        changed = [
+            ingredient for ingredient in candidates
+            if names_count[ingredient.name] == 1
+            and ingredient.measurement_unit != units[ingredient.name]
+        ]
+        for ingredient in changed:
+            ingredient.measurement_unit = units[ingredient.name]
+        Ingredient.objects.bulk_update(
+            changed,
+            ('measurement_unit',),
+            batch_size=self.batch_size,
+        )
+        return len(changed)
+
+    def bulk_import(self, rows, update_units):
+        updated = self.update_units(rows) if update_units else 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in batch
+                ),
+                ignore_conflicts=True,
+            )
+            self.report_progress(start + len(batch), len(rows))
+        return updated
+
+    def copy_import(self, rows, update_units):
+        if connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только для PostgreSQL.')
+        table = Ingredient._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        updated = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name varchar, measurement_unit varchar) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            self.report_progress(len(rows), len(rows))
+            if update_units:
+                cursor.execute(
+                    f'UPDATE {table} AS i '
+                    'SET measurement_unit = s.measurement_unit '
+                    'FROM (SELECT name, min(measurement_unit) '
+                    'AS measurement_unit FROM ingredient_import '
+                    'GROUP BY name HAVING count(*) = 1) AS s '
+                    'WHERE i.name = s.name '
+                    'AND i.measurement_unit <> s.measurement_unit '
+                    f'AND (SELECT count(*) FROM {table} AS d '
+                    'WHERE d.name = i.name) = 1'
+                )
+                updated = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_import '
+                'ON CONFLICT DO NOTHING'
+            )
+        return updated
+
+    def report_progress(self, done, total):
+        self.stdout.write(f'Обработано {done} из {total} строк')
 
     def handle(self, *args, **options):
-        csv_file = options['csv_file']
-        with open(csv_file, 'r', encoding='utf8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                mymodel = Ingredient()
-                mymodel.name = row[0]
-                mymodel.measurement_unit = row[1]
-                mymodel.save()
+        path = options['csv_file']
+        self.batch_size = options['batch_size']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        started = monotonic()
+        rows = self.read_rows(path)
+        count_before = Ingredient.objects.count()
+        import_rows = self.copy_import if options['copy'] else self.bulk_import
+        with transaction.atomic():
+            updated = import_rows(rows, options['update_units'])
+        bump_catalogue_version(Ingredient)
+        created = Ingredient.objects.count() - count_before
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено {created}, обновлено {updated}, '
+            f'пропущено {len(rows) - created - updated} ингредиентов '
+            f'за {elapsed:.2f} с ({len(rows) / elapsed:.0f} строк/с)'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Пересборка сводных списков покупок пользователей'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: {created} ингредиентов'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, Shopping_cart
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного и списков покупок у рецептов'
+
+    @staticmethod
+    def count_subquery(model, field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{field: OuterRef('pk')}).order_by()
+                .values(field).annotate(count=Count('pk')).values('count')
+            ),
+            0,
+        )
+
+    def handle(self, *args, **options):
+        updated = Recipe.objects.update(
+            favorites_count=self.count_subquery(Favorite, 'recipe'),
+            carts_count=self.count_subquery(Shopping_cart, 'recipe_to_buy'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны для {updated} рецептов'
+        ))
@@ -0,0 +1,120 @@
+# Generated by Django 3.2 on 2026-10-18 02:56
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_TRIGGERS = """
+CREATE FUNCTION recipes_recipe_search_vector(
+    recipe_id bigint, recipe_name text, recipe_text text
+) RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('russian', coalesce(recipe_name, '')), 'A')
+        || setweight(to_tsvector('russian',
+                     coalesce(string_agg(i.name, ' '), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(recipe_text, '')), 'C')
+    FROM recipes_recipeingredient AS ri
+    JOIN recipes_ingredient AS i ON i.id = ri.ingredient_id
+    WHERE ri.recipe_id = $1
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION recipes_recipe_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.id, NEW.name, NEW.text
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipe_search
+    BEFORE INSERT OR UPDATE OF name, text, search_vector
+    ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_trigger();
+
+CREATE FUNCTION recipes_recipeingredient_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE recipes_recipe SET search_vector = NULL
+        WHERE id IN (SELECT recipe_id FROM new_rows);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE recipes_recipe SET search_vector = NULL
+        WHERE id IN (SELECT recipe_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipeingredient_search_insert
+    AFTER INSERT ON recipes_recipeingredient
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_recipeingredient_search_trigger();
+
+CREATE TRIGGER recipes_recipeingredient_search_update
+    AFTER UPDATE ON recipes_recipeingredient
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_recipeingredient_search_trigger();
+
+CREATE TRIGGER recipes_recipeingredient_search_delete
+    AFTER DELETE ON recipes_recipeingredient
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_recipeingredient_search_trigger();
+
+CREATE FUNCTION recipes_ingredient_search_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipes_recipe SET search_vector = NULL
+    WHERE id IN (
+        SELECT recipe_id FROM recipes_recipeingredient
+        WHERE ingredient_id = NEW.id
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_ingredient_search
+    AFTER UPDATE OF name ON recipes_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipes_ingredient_search_trigger();
+
+UPDATE recipes_recipe SET search_vector = NULL;
+"""
+
+DROP_SEARCH_TRIGGERS = """
+DROP TRIGGER recipes_ingredient_search ON recipes_ingredient;
+DROP FUNCTION recipes_ingredient_search_trigger();
+DROP TRIGGER recipes_recipeingredient_search_insert
+    ON recipes_recipeingredient;
+DROP TRIGGER recipes_recipeingredient_search_update
+    ON recipes_recipeingredient;
+DROP TRIGGER recipes_recipeingredient_search_delete
+    ON recipes_recipeingredient;
+DROP FUNCTION recipes_recipeingredient_search_trigger();
+DROP TRIGGER recipes_recipe_search ON recipes_recipe;
+DROP FUNCTION recipes_recipe_search_trigger();
+DROP FUNCTION recipes_recipe_search_vector(bigint, text, text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGERS, DROP_SEARCH_TRIGGERS),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 3.2 on 2026-10-18 03:04
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import CreateExtension
+from django.db import migrations, models
+
+RECIPE_TRIGGER = """
+CREATE OR REPLACE FUNCTION recipes_recipe_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.id, NEW.name, NEW.text
+    );
+    NEW.ingredient_ids := ARRAY(
+        SELECT ingredient_id::integer FROM recipes_recipeingredient
+        WHERE recipe_id = NEW.id ORDER BY ingredient_id
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER recipes_recipe_search ON recipes_recipe;
+CREATE TRIGGER recipes_recipe_search
+    BEFORE INSERT OR UPDATE OF name, text, search_vector, ingredient_ids
+    ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_trigger();
+
+UPDATE recipes_recipe SET search_vector = NULL;
+"""
+
+OLD_RECIPE_TRIGGER = """
+CREATE OR REPLACE FUNCTION recipes_recipe_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.id, NEW.name, NEW.text
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER recipes_recipe_search ON recipes_recipe;
+CREATE TRIGGER recipes_recipe_search
+    BEFORE INSERT OR UPDATE OF name, text, search_vector
+    ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_trigger();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        CreateExtension('intarray'),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, editable=False, size=None),
+        ),
+        migrations.RunSQL(RECIPE_TRIGGER, OLD_RECIPE_TRIGGER),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx', opclasses=['gin__int_ops']),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 03:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_SHOPPING_LISTS = """
+INSERT INTO recipes_shoppinglistitem (user_id, ingredient_id, amount)
+SELECT cart.user_to_buy_id, ri.ingredient_id, SUM(ri.amount)
+FROM recipes_shopping_cart AS cart
+JOIN recipes_recipeingredient AS ri ON ri.recipe_id = cart.recipe_to_buy_id
+GROUP BY cart.user_to_buy_id, ri.ingredient_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0016_relation_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Сводные списки покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user&shopping_list_ingredient'),
+        ),
+        migrations.RunSQL(FILL_SHOPPING_LISTS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 04:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_shopping_list'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'verbose_name': 'Рецепты и ингредиенты', 'verbose_name_plural': 'Рецепты и ингредиенты'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipetag',
+            options={'verbose_name': 'Рецепты и теги', 'verbose_name_plural': 'Рецепты и теги'},
+        ),
+    ]
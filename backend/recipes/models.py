@@ -1,7 +1,11 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models.constraints import UniqueConstraint
+from django.db.models.functions import Upper
 
 from foodgram_backend.constants import (MAX_AMOUNT, MAX_COOKING_TIME,
                                         MIN_AMOUNT, MIN_COOKING_TIME,
@@ -23,6 +27,10 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images/',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        editable=False,
+    )
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
             MinValueValidator(MIN_COOKING_TIME),
@@ -35,9 +43,33 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField('Tag', through='RecipeTag')
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+    ingredient_ids = ArrayField(
+        models.IntegerField(),
+        default=list,
+        editable=False,
+    )
+    in_feeds = models.BooleanField(
+        'Разослан в ленты подписчиков',
+        default=False,
+        editable=False,
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         constraints = [
@@ -46,6 +78,30 @@ class Recipe(models.Model):
                 name='name&text',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx',
+            ),
+            GinIndex(
+                fields=['ingredient_ids'],
+                name='recipe_ingredient_ids_idx',
+                opclasses=['gin__int_ops'],
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_feed_on_read_idx',
+                condition=models.Q(in_feeds=False),
+            ),
+        ]
 
     def __str__(self):
         return self.name[:STR_LENGTH]
@@ -73,13 +129,26 @@ class Tag(models.Model):
 class RecipeTag(models.Model):
     """Связующая модель рецептов и тегов."""
 
-    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
-    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, db_index=False)
 
     class Meta:
-        ordering = ['recipe']
         verbose_name = 'Рецепты и теги'
         verbose_name_plural = 'Рецепты и теги'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'tag'],
+                name='recipetag_recipe_tag_idx',
+            ),
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipetag_tag_recipe_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.tag}'
@@ -103,6 +172,16 @@ class Ingredient(models.Model):
                 name='name&measurement_unit',
             )
         ]
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_prefix_idx',
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name[:STR_LENGTH]
@@ -124,7 +203,6 @@ class RecipeIngredient(models.Model):
     )
 
     class Meta:
-        ordering = ('recipe',)
         verbose_name = 'Рецепты и ингредиенты'
         verbose_name_plural = 'Рецепты и ингредиенты'
 
@@ -139,6 +217,7 @@ class Favorite(models.Model):
         CustomUser,
         on_delete=models.CASCADE,
         related_name='user',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -147,7 +226,6 @@ class Favorite(models.Model):
     )
 
     class Meta:
-        ordering = ('user__username',)
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
         constraints = [
@@ -168,6 +246,7 @@ class Shopping_cart(models.Model):
         CustomUser,
         on_delete=models.CASCADE,
         related_name='user_to_buy',
+        db_index=False,
     )
     recipe_to_buy = models.ForeignKey(
         Recipe,
@@ -176,7 +255,6 @@ class Shopping_cart(models.Model):
     )
 
     class Meta:
-        ordering = ('user_to_buy__username',)
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
         constraints = [
@@ -188,3 +266,75 @@ class Shopping_cart(models.Model):
 
     def __str__(self):
         return f'Пользователь {self.user_to_buy}, рецепт {self.recipe_to_buy}'
+
+
+class ShoppingListItem(models.Model):
+    """Ингредиент в сводном списке покупок пользователя: сумма
+    количеств по всем рецептам из его списка покупок."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    amount = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user&shopping_list_ingredient',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок {self.user}'
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user&feed_recipe',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models import Sum
+
+from .models import RecipeIngredient, Shopping_cart, ShoppingListItem
+
+ITEMS = ShoppingListItem._meta.db_table
+RECIPE_INGREDIENTS = RecipeIngredient._meta.db_table
+CARTS = Shopping_cart._meta.db_table
+
+UPSERT = (
+    f'INSERT INTO {ITEMS} AS item (user_id, ingredient_id, amount) '
+    '{select} '
+    'ON CONFLICT (user_id, ingredient_id) '
+    'DO UPDATE SET amount = item.amount + EXCLUDED.amount'
+)
+
+
+def change_shopping_list(user_id, recipe_id, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта
+    в сводном списке покупок пользователя."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT.format(select=(
+                'SELECT %s, ingredient_id, %s * SUM(amount) '
+                f'FROM {RECIPE_INGREDIENTS} WHERE recipe_id = %s '
+                'GROUP BY ingredient_id'
+            )),
+            [user_id, sign, recipe_id],
+        )
+
+
+def recipe_amounts(recipe_id):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id'
+        ).annotate(Sum('amount')).order_by()
+    )
+
+
+def update_shopping_lists(recipe_id, before, after):
+    """Переносит изменение ингредиентов рецепта (словари
+    id ингредиента -> количество до и после) в сводные списки
+    всех пользователей, у которых рецепт в списке покупок."""
+    deltas = {
+        ingredient_id: after.get(ingredient_id, 0) - before.get(
+            ingredient_id, 0
+        )
+        for ingredient_id in before.keys() | after.keys()
+    }
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT.format(select=(
+                'SELECT cart.user_to_buy_id, delta.ingredient_id, '
+                f'delta.amount FROM {CARTS} AS cart '
+                'CROSS JOIN unnest(%s::bigint[], %s::integer[]) '
+                'AS delta (ingredient_id, amount) '
+                'WHERE cart.recipe_to_buy_id = %s'
+            )),
+            [list(deltas), list(deltas.values()), recipe_id],
+        )
+
+
+@contextmanager
+def tracking_shopping_lists(recipe_ids):
+    """Переносит в сводные списки покупок изменения ингредиентов
+    рецептов, сделанные внутри блока."""
+    before = {recipe_id: recipe_amounts(recipe_id) for recipe_id in recipe_ids}
+    yield
+    for recipe_id, amounts in before.items():
+        update_shopping_lists(recipe_id, amounts, recipe_amounts(recipe_id))
+
+
+def rebuild_shopping_lists():
+    """Пересобирает сводные списки покупок всех пользователей."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {ITEMS}')
+        cursor.execute(
+            UPSERT.format(select=(
+                'SELECT cart.user_to_buy_id, ri.ingredient_id, '
+                f'SUM(ri.amount) FROM {CARTS} AS cart '
+                f'JOIN {RECIPE_INGREDIENTS} AS ri '
+                'ON ri.recipe_id = cart.recipe_to_buy_id '
+                'GROUP BY cart.user_to_buy_id, ri.ingredient_id'
+            )),
+        )
+        return cursor.rowcount
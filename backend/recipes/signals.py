@@ -0,0 +1,129 @@
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import CustomUser, Subscription
+from .cache import (bump_catalogue_version, bump_recipe_versions,
+                    bump_recipes_version)
+from .feed import backfill_feed, fan_out
+from .images import media_url, schedule_image_variants
+from .models import (Favorite, FeedItem, Ingredient, Recipe, Shopping_cart,
+                     Tag)
+from .shopping_list import change_shopping_list
+
+RECIPE_COUNTERS = {
+    Favorite: ('recipe_id', 'favorites_count'),
+    Shopping_cart: ('recipe_to_buy_id', 'carts_count'),
+}
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_catalogue(sender, **kwargs):
+    bump_catalogue_version(sender)
+    transaction.on_commit(bump_recipes_version)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    # Django обнуляет pk удалённого объекта раньше, чем выполнится
+    # on_commit.
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: bump_recipe_versions([recipe_id]))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    if created or update_fields == frozenset(['last_login']):
+        return
+    transaction.on_commit(lambda: bump_recipe_versions(
+        Recipe.objects.filter(author=instance).values_list('pk', flat=True)
+    ))
+
+
+def change_recipe_counter(sender, instance, delta):
+    recipe_field, counter = RECIPE_COUNTERS[sender]
+    Recipe.objects.filter(pk=getattr(instance, recipe_field)).update(
+        **{counter: F(counter) + delta}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Shopping_cart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_counter(sender, instance, 1)
+
+
+def lock_for_delete(sender, instance):
+    """Блокирует удаляемую строку до конца транзакции удаления.
+
+    post_delete отправляется, даже если строку уже удалил параллельный
+    запрос, поэтому счётчики и сводный список покупок меняются в
+    pre_delete и только для найденной строки: второе удаление
+    дождётся коммита первого и строку уже не найдёт.
+    """
+    return sender.objects.select_for_update().filter(pk=instance.pk).exists()
+
+
+# pre_delete: при удалении рецепта каскад удаляет его ингредиенты
+# раньше, чем отправляется post_delete для списков покупок.
+@receiver(pre_delete, sender=Favorite)
+@receiver(pre_delete, sender=Shopping_cart)
+def remove_recipe_relation(sender, instance, **kwargs):
+    if not lock_for_delete(sender, instance):
+        return
+    change_recipe_counter(sender, instance, -1)
+    if sender is Shopping_cart:
+        change_shopping_list(
+            instance.user_to_buy_id, instance.recipe_to_buy_id, -1
+        )
+
+
+@receiver(post_save, sender=Shopping_cart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        change_shopping_list(
+            instance.user_to_buy_id, instance.recipe_to_buy_id, 1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_variants(sender, instance, **kwargs):
+    if instance.image and (
+        instance.image.name != instance.image_variants.get('source')
+    ):
+        transaction.on_commit(
+            lambda: schedule_image_variants(instance.pk)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: fan_out(instance.author_id, [instance.pk])
+        )
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    FeedItem.objects.filter(
+        user_id=instance.subscriber_id,
+        author_id=instance.author_id,
+    ).delete()
+
+
+@receiver(setting_changed)
+def clear_media_urls(setting, **kwargs):
+    if setting in ('MEDIA_URL', 'DEFAULT_FILE_STORAGE'):
+        media_url.cache_clear()
@@ -0,0 +1,1019 @@
+import asyncio
+import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.test import (AsyncClient, RequestFactory, SimpleTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.metrics import QueryBudgetExceeded
+from api.middleware import ReplicaMiddleware
+from api.parsers import RecipeJSONParser
+from api.relations import load_relations
+from api.serializers import FieldPlanMixin, RecipeCreateSerializer
+from api.views import RecipeViewSet
+from foodgram_backend.constants import (AUTOCOMPLETE_LIMIT,
+                                        AUTOCOMPLETE_MAX_LIMIT,
+                                        POPULAR_RECIPE_ORDERING,
+                                        RECIPE_ORDERING,
+                                        WHAT_TO_COOK_MAX_INGREDIENTS)
+from foodgram_backend.db import read_from
+from users.models import CustomUser, Subscription
+from .admin import RecipeIngredientAdmin
+from .models import (Favorite, FeedItem, Ingredient, Recipe,
+                     RecipeIngredient, RecipeTag, Shopping_cart,
+                     ShoppingListItem, Tag)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True, DATABASE_REPLICAS=[])
+class RecipeAPITestCase(APITestCase):
+    """Пользователи, теги и ингредиенты для тестов API рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(
+            username='reader', email='reader@foodgram.ru',
+            first_name='Reader', last_name='Reader',
+        )
+        cls.author = CustomUser.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author',
+        )
+        Subscription.objects.create(subscriber=cls.user, author=cls.author)
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}',
+                               color='#FFFFFF')
+            for i in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def create_recipes(self, count):
+        for i in range(Recipe.objects.count(), count):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}',
+                text=f'Описание {i}',
+                author=self.author,
+                image='recipes/images/test.png',
+                cooking_time=10,
+            )
+            recipe.tags.set(self.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in self.ingredients
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            Shopping_cart.objects.create(user_to_buy=self.user,
+                                         recipe_to_buy=recipe)
+
+
+class RecipeListQueriesTest(RecipeAPITestCase):
+    """Количество запросов к БД в списке рецептов."""
+
+    def count_list_queries(self):
+        # Множества связей пользователя загружаются заново.
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for authenticated in (False, True):
+            with self.subTest(authenticated=authenticated):
+                self.client.force_authenticate(
+                    self.user if authenticated else None
+                )
+                Recipe.objects.all().delete()
+                self.create_recipes(1)
+                single_recipe_queries = self.count_list_queries()
+                self.create_recipes(6)
+                self.assertEqual(
+                    self.count_list_queries(), single_recipe_queries
+                )
+
+    def test_relation_flags_and_nested_fields(self):
+        self.create_recipes(1)
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+        # Автор загружается в том же запросе, что и рецепты.
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT "users_customuser"')
+            for query in context.captured_queries
+        ))
+        recipe = response.data['results'][0]
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertEqual(len(recipe['ingredients']), 3)
+        self.assertEqual(len(recipe['tags']), 2)
+
+
+class MetricsTest(RecipeAPITestCase):
+    """Метрики обработчиков и бюджет запросов к БД."""
+
+    def test_query_budget(self):
+        self.create_recipes(1)
+        response = self.client.get('/api/recipes/')
+        self.assertIn('desc="', response['Server-Timing'])
+        cache.clear()
+        with override_settings(QUERY_BUDGETS={'RecipeViewSet.list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/recipes/')
+
+
+class RecipeUpdateTest(RecipeAPITestCase):
+    """Редактирование рецепта."""
+
+    def test_update_keeps_counters(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=F('favorites_count') + 5
+        )
+        serializer = RecipeCreateSerializer(
+            recipe, data={'cooking_time': 20}, partial=True
+        )
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.cooking_time, 20)
+        self.assertEqual(recipe.favorites_count, 6)
+
+
+class RecipeCountersTest(RecipeAPITestCase):
+    """Счётчики избранного и списков покупок рецепта."""
+
+    def test_repeated_delete(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        Shopping_cart.objects.create(user_to_buy=self.author,
+                                     recipe_to_buy=recipe)
+        # Два одновременных DELETE удаляют одну и ту же строку через
+        # разные экземпляры.
+        for model, lookup in (
+            (Favorite, {'user': self.user}),
+            (Shopping_cart, {'user_to_buy': self.user}),
+        ):
+            first = model.objects.get(**lookup)
+            second = model.objects.get(**lookup)
+            self.assertEqual(first.delete()[0], 1)
+            self.assertEqual(second.delete()[0], 0)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.carts_count, 1)
+        self.client.force_authenticate(self.author)
+        for url in (f'/api/recipes/{recipe.id}/favorite/',
+                    f'/api/recipes/{recipe.id}/shopping_cart/'):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 404)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(recipe.carts_count, 0)
+
+
+class PopularOrderingTest(RecipeAPITestCase):
+    """Сортировка рецептов по числу добавлений в избранное."""
+
+    def test_popular_pages(self):
+        self.create_recipes(5)
+        for count, recipe in enumerate(Recipe.objects.order_by('name')):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=count % 3
+            )
+        expected = list(Recipe.objects.order_by(
+            *POPULAR_RECIPE_ORDERING
+        ).values_list('pk', flat=True))
+        ids = []
+        url = '/api/recipes/?ordering=popular&limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], 5)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, expected)
+
+
+class WhatToCookTest(RecipeAPITestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    def create_recipe(self, name, ingredients):
+        recipe = Recipe.objects.create(
+            name=name, text=name, author=self.author,
+            image='recipes/images/test.png', cooking_time=10,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def what_to_cook(self, ingredients, **params):
+        return self.client.get('/api/recipes/what_to_cook/', {
+            'ingredients': [ingredient.id for ingredient in ingredients],
+            **params,
+        })
+
+    def test_coverage_order(self):
+        first, second, third = self.ingredients
+        self.create_recipe('Всё есть', [first])
+        self.create_recipe('Две трети', [first, second, third])
+        self.create_recipe('Ничего нет', [third])
+        self.create_recipe('Половина', [first, third])
+        matches = [
+            ('Всё есть', 1, 0),
+            ('Две трети', 2 / 3, 1),
+            ('Половина', 0.5, 1),
+        ]
+        cases = (
+            ({}, matches),
+            ({'max_missing': 0}, matches[:1]),
+            ({'max_missing': 1}, matches),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.what_to_cook(
+                    [first, second, first], **params
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['count'], len(expected))
+                results = [
+                    (recipe['name'], recipe['coverage'],
+                     recipe['missing_count'])
+                    for recipe in response.data['results']
+                ]
+                for result, (name, coverage, missing_count) in zip(
+                    results, expected
+                ):
+                    self.assertEqual(result[0], name)
+                    self.assertAlmostEqual(result[1], coverage)
+                    self.assertEqual(result[2], missing_count)
+
+    def test_ingredients_change(self):
+        first, _, third = self.ingredients
+        recipe = self.create_recipe('Рецепт', [third])
+        self.assertEqual(self.what_to_cook([first]).data['count'], 0)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'id': first.id, 'amount': 1}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_ids, [first.id])
+        response = self.what_to_cook([first])
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['coverage'], 1)
+
+    def test_validation(self):
+        url = '/api/recipes/what_to_cook/'
+        first = self.ingredients[0].id
+        cases = (
+            {},
+            {'ingredients': 'молоко'},
+            {'ingredients': 0},
+            {'ingredients': 2 ** 31},
+            {'ingredients': range(1, WHAT_TO_COOK_MAX_INGREDIENTS + 2)},
+            {'ingredients': first, 'max_missing': -1},
+            {'ingredients': first, 'max_missing': 'два'},
+        )
+        for params in cases:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    set(response.data),
+                    {'max_missing' if 'max_missing' in params
+                     else 'ingredients'},
+                )
+        response = self.client.get(
+            url,
+            {'ingredients': range(1, WHAT_TO_COOK_MAX_INGREDIENTS + 1)},
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTest(RecipeAPITestCase):
+    """Лента подписок: разосланные рецепты и рецепты, которые
+    добавляются при чтении."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.popular = CustomUser.objects.create(
+            username='popular', email='popular@foodgram.ru',
+            first_name='Popular', last_name='Popular',
+        )
+        for subscriber in (cls.user, cls.author):
+            Subscription.objects.create(subscriber=subscriber,
+                                        author=cls.popular)
+
+    def publish(self, author, minute, fan_out=True):
+        with self.captureOnCommitCallbacks(execute=fan_out):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {Recipe.objects.count()}', text='Описание',
+                author=author, image='recipes/images/test.png',
+                cooking_time=10,
+            )
+        pub_date = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(
+            minutes=minute
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+        FeedItem.objects.filter(recipe=recipe).update(pub_date=pub_date)
+        return recipe
+
+    def read_feed(self, url, direction):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            last_url, url = url, response.data[direction]
+        return pages, last_url
+
+    def test_feed_pages(self):
+        for author, minute in (
+            (self.author, 1), (self.popular, 1), (self.author, 2),
+            (self.popular, 3), (self.author, 3), (self.author, 3),
+            (self.popular, 4), (self.author, 5),
+        ):
+            self.publish(author, minute)
+        self.publish(self.author, 6, fan_out=False)
+        self.assertEqual(FeedItem.objects.filter(user=self.user).count(), 5)
+        self.assertFalse(
+            FeedItem.objects.filter(author=self.popular).exists()
+        )
+        expected = list(Recipe.objects.order_by(
+            *RECIPE_ORDERING
+        ).values_list('pk', flat=True))
+        self.client.force_authenticate(self.user)
+        pages, last_url = self.read_feed(
+            '/api/recipes/feed/?limit=3', 'next'
+        )
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3])
+        response = self.client.get(last_url)
+        previous_pages, _ = self.read_feed(
+            response.data['previous'], 'previous'
+        )
+        self.assertEqual(previous_pages, pages[-2::-1])
+
+    def test_subscribe_and_unsubscribe(self):
+        recipes = [self.publish(self.author, minute) for minute in (1, 2)]
+        follower = CustomUser.objects.create(
+            username='follower', email='follower@foodgram.ru',
+            first_name='Follower', last_name='Follower',
+        )
+        self.client.force_authenticate(follower)
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(
+            FeedItem.objects.filter(user=follower).count(), len(recipes)
+        )
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.id for recipe in reversed(recipes)],
+        )
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(FeedItem.objects.filter(user=follower).exists())
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.data['results'], [])
+
+
+class SearchTest(RecipeAPITestCase):
+    """Полнотекстовый поиск рецептов."""
+
+    def create_recipe(self, name, text, ingredients):
+        recipe = Recipe.objects.create(
+            name=name, text=text, author=self.author,
+            image='recipes/images/test.png', cooking_time=10,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_search_rank(self):
+        beet = Ingredient.objects.create(name='Свекла', measurement_unit='г')
+        self.create_recipe('Свекла печеная', 'Запечь', self.ingredients[1:])
+        self.create_recipe('Винегрет', 'Перемешать', [beet])
+        self.create_recipe('Салат', 'Нарезать свеклу кубиками',
+                           self.ingredients[:1])
+        self.create_recipe('Омлет', 'Взбить яйца', self.ingredients)
+        self.assertEqual(
+            self.search('свекла'),
+            ['Свекла печеная', 'Винегрет', 'Салат'],
+        )
+
+    def test_search_vector_updates(self):
+        cabbage, spinach, _ = self.ingredients
+        recipe = self.create_recipe('Щи', 'Варить час', [cabbage])
+        self.assertEqual(self.search('шпинат'), [])
+        spinach.name = 'Шпинат'
+        spinach.save()
+        self.assertEqual(self.search('шпинат'), [])
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'id': spinach.id, 'amount': 1}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search('шпинат'), ['Щи'])
+        spinach.name = 'Щавель'
+        spinach.save()
+        self.assertEqual(self.search('шпинат'), [])
+        self.assertEqual(self.search('щавель'), ['Щи'])
+
+
+class SubscriptionsTest(RecipeAPITestCase):
+    """Список подписок пользователя."""
+
+    def follow(self, count):
+        for i in range(Subscription.objects.filter(
+            subscriber=self.user
+        ).count(), count):
+            author = CustomUser.objects.create(
+                username=f'author{i}', email=f'author{i}@foodgram.ru',
+                first_name='Author', last_name='Author',
+            )
+            Subscription.objects.create(subscriber=self.user, author=author)
+            for j in range(3):
+                Recipe.objects.create(
+                    name=f'Рецепт {i}-{j}', text='Описание', author=author,
+                    image='recipes/images/test.png', cooking_time=10,
+                )
+
+    def count_queries(self, url='/api/users/subscriptions/'):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_does_not_depend_on_subscriptions(self):
+        self.client.force_authenticate(self.user)
+        self.follow(2)
+        few_authors_queries = self.count_queries()
+        self.follow(9)
+        self.assertEqual(self.count_queries(), few_authors_queries)
+        self.assertEqual(
+            self.count_queries('/api/users/subscriptions/?recipes_limit=2'),
+            few_authors_queries,
+        )
+
+    def test_recipes_limit(self):
+        self.client.force_authenticate(self.user)
+        self.follow(2)
+        self.assertEqual(Recipe.objects.count(), 3)
+        url = '/api/users/subscriptions/'
+        for params, length in (({}, None), ({'recipes_limit': 2}, 2)):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['count'], 2)
+                for author in response.data['results']:
+                    recipes = list(Recipe.objects.filter(
+                        author_id=author['id']
+                    ).order_by(*RECIPE_ORDERING).values_list('pk', flat=True))
+                    self.assertEqual(author['recipes_count'], len(recipes))
+                    self.assertTrue(author['is_subscribed'])
+                    self.assertEqual(
+                        [recipe['id'] for recipe in author['recipes']],
+                        recipes[:length],
+                    )
+        response = self.client.get(url, {'recipes_limit': 'два'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipes_limit', response.data)
+
+
+class AutocompleteTest(RecipeAPITestCase):
+    """Подсказки ингредиентов."""
+
+    url = '/api/ingredients/autocomplete/'
+
+    def autocomplete(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_groups_order(self):
+        for name in ('Кокосовое молоко', 'Молока', 'Молоко сгущенное',
+                     'Соль', 'Сухое молоко', 'Молоко'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        self.assertEqual(self.autocomplete(name='молоко'), [
+            'Молоко', 'Молоко сгущенное', 'Сухое молоко',
+            'Кокосовое молоко', 'Молока',
+        ])
+        self.assertEqual(
+            self.autocomplete(name='молоко', limit=3),
+            ['Молоко', 'Молоко сгущенное', 'Сухое молоко'],
+        )
+
+    def test_limit(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Перец {i}', measurement_unit='г')
+            for i in range(AUTOCOMPLETE_MAX_LIMIT + 10)
+        )
+        self.assertEqual(
+            len(self.autocomplete(name='перец')), AUTOCOMPLETE_LIMIT
+        )
+        self.assertEqual(
+            len(self.autocomplete(name='перец', limit=1000)),
+            AUTOCOMPLETE_MAX_LIMIT,
+        )
+        self.assertEqual(self.autocomplete(name='перец', limit=0), [])
+        self.assertEqual(self.autocomplete(name=' '), [])
+        response = self.client.get(self.url, {'name': 'перец', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('limit', response.data)
+
+
+class UserRelationsTest(RecipeAPITestCase):
+    """Кэш множеств связей пользователя."""
+
+    def test_relations_invalidation(self):
+        def get_recipe():
+            with CaptureQueriesContext(connection) as context:
+                recipe = self.client.get(url).data
+            loaded = any(
+                'UNION' in query['sql'] for query in context.captured_queries
+            )
+            return recipe, loaded
+
+        self.create_recipes(1)
+        self.client.force_authenticate(self.user)
+        url = f'/api/recipes/{Recipe.objects.first().id}/'
+        self.assertTrue(get_recipe()[0]['is_favorited'])
+        self.assertFalse(get_recipe()[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'{url}favorite/')
+        self.assertEqual(response.status_code, 204)
+        recipe, loaded = get_recipe()
+        self.assertTrue(loaded)
+        self.assertFalse(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertFalse(get_recipe()[1])
+
+    def test_relations_read_primary(self):
+        self.create_recipes(1)
+        # Реплики в тестах нет: чтение из неё завершилось бы ошибкой.
+        with read_from('replica'):
+            relations = load_relations(self.user.pk)
+        self.assertEqual(relations['favorites'],
+                         {Recipe.objects.get().pk})
+
+
+class ShoppingListTest(RecipeAPITestCase):
+    """Сводный список покупок."""
+
+    def test_shopping_list_is_maintained(self):
+        self.create_recipes(2)
+        first, second = Recipe.objects.order_by('name')
+
+        def assert_matches_carts():
+            expected = RecipeIngredient.objects.filter(
+                recipe__recipe_to_buy__user_to_buy=self.user
+            ).order_by().values('ingredient').annotate(total=Sum('amount'))
+            response = self.client.get('/api/recipes/shopping_list/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                {item['id']: item['amount'] for item in response.data},
+                {item['ingredient']: item['total'] for item in expected},
+            )
+
+        self.client.force_authenticate(self.user)
+        assert_matches_carts()
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{first.id}/',
+            {'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 5},
+                {'id': self.ingredients[1].id, 'amount': 1},
+            ]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.user)
+        assert_matches_carts()
+        response = self.client.delete(
+            f'/api/recipes/{second.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        assert_matches_carts()
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertIn(
+            f'{self.ingredients[0].name}, 5 г',
+            b''.join(response.streaming_content).decode(),
+        )
+        item = RecipeIngredient.objects.get(
+            recipe=first, ingredient=self.ingredients[1]
+        )
+        RecipeIngredientAdmin(RecipeIngredient, admin.site).delete_model(
+            None, item
+        )
+        assert_matches_carts()
+        first.delete()
+        self.assertEqual(self.client.get('/api/recipes/shopping_list/').data,
+                         [])
+
+    def test_repeated_cart_delete(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        first = Shopping_cart.objects.get(user_to_buy=self.user)
+        second = Shopping_cart.objects.get(user_to_buy=self.user)
+        first.delete()
+        second.delete()
+        self.assertFalse(
+            ShoppingListItem.objects.filter(
+                user=self.user, amount__lt=0
+            ).exists()
+        )
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/recipes/shopping_list/')
+        self.assertEqual(
+            {item['id']: item['amount'] for item in response.data},
+            {ingredient.id: 1 for ingredient in self.ingredients},
+        )
+
+
+@override_settings(SHARED_CACHE=True)
+class AnonymousCacheTest(RecipeAPITestCase):
+    """Кэш ответов анонимным пользователям."""
+
+    def test_anonymous_response_cache(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.first()
+        etags = {}
+        for url in ('/api/recipes/?tags=tag0&limit=2',
+                    f'/api/recipes/{recipe.id}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Cache-Control'],
+                                 'public, max-age=10')
+                self.assertIn('Authorization', response['Vary'])
+                with self.assertNumQueries(0):
+                    cached = self.client.get(url)
+                    not_modified = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(cached.content, response.content)
+                self.assertEqual(not_modified.status_code, 304)
+                etags[url] = response['ETag']
+        for change in (
+            Recipe.objects.get(pk=recipe.pk).save,
+            self.author.save,
+            self.tags[0].save,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            for url, etag in etags.items():
+                with self.subTest(change=change, url=url):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+                    etags[url] = response['ETag']
+        self.client.force_authenticate(self.user)
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_miss_reads_primary(self):
+        self.create_recipes(1)
+        with mock.patch('api.mixins.read_from', wraps=read_from) as mocked:
+            self.client.get('/api/recipes/')
+            self.client.get('/api/recipes/')
+        mocked.assert_called_once_with(DEFAULT_DB_ALIAS)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_disabled_without_shared_cache(self):
+        self.create_recipes(1)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class CatalogueCacheTest(RecipeAPITestCase):
+    """Условные запросы к каталогам тегов и ингредиентов."""
+
+    def test_catalogue_etag(self):
+        url = '/api/tags/'
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        not_modified = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        # Изменение в ту же секунду не должно давать устаревший 304.
+        with mock.patch('recipes.cache.time', return_value=2e9):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tags[0].save()
+        response = self.client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=http_date(2e9),
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(2e9 + 1)
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class FieldPlanTest(RecipeAPITestCase):
+    """Быстрая сериализация по плану полей."""
+
+    def test_field_plan_matches_drf(self):
+        self.create_recipes(2)
+        Recipe.objects.filter(name='Рецепт 0').update(
+            text='Первая строка\u2028вторая строка'
+        )
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.first()
+        for url in (
+            '/api/recipes/',
+            f'/api/recipes/{recipe.id}/',
+            '/api/users/subscriptions/',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with mock.patch.object(
+                    FieldPlanMixin, 'use_field_plan', False
+                ):
+                    expected = self.client.get(url).data
+                self.assertEqual(
+                    response.content, JSONRenderer().render(expected)
+                )
+
+
+class AsgiModeTest(RecipeAPITestCase):
+    """Работа в режиме ASGI."""
+
+    def test_asgi_mode(self):
+        async def get(path):
+            return await AsyncClient().get(path)
+
+        self.create_recipes(1)
+        response = async_to_sync(get)('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+        with override_settings(SERVER_MODE='asgi'):
+            view = RecipeViewSet.as_view({'get': 'retrieve'})
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        request = APIRequestFactory().get('/api/recipes/0/')
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch('api.offload.get_executor', return_value=executor):
+            response = async_to_sync(view)(request, pk=0)
+        executor.submit(connections.close_all).result()
+        executor.shutdown()
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(response.is_rendered)
+
+
+class QueryPlanTest(RecipeAPITestCase):
+    """Частые запросы используют подходящие индексы.
+
+    В тестовой базе мало строк, поэтому последовательное сканирование
+    и сортировка отключаются: план показывает, есть ли у запроса
+    индекс, который отдаёт строки в нужном порядке.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(2)
+        self.recipe = Recipe.objects.first()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_relation_lookups(self):
+        cases = (
+            (
+                Favorite.objects.filter(user=self.user, recipe=self.recipe),
+                'unique_user&recipe',
+            ),
+            (
+                Shopping_cart.objects.filter(
+                    user_to_buy=self.user, recipe_to_buy=self.recipe
+                ),
+                'unique_user_to_buy&recipe_to_buy',
+            ),
+            (
+                Subscription.objects.filter(subscriber=self.user),
+                'unique_subscriber&author',
+            ),
+            (
+                Subscription.objects.filter(author=self.author).values(
+                    'subscriber'
+                ),
+                'subscription_author_idx',
+            ),
+            (
+                RecipeTag.objects.filter(recipe__in=[self.recipe]),
+                'recipetag_recipe_tag_idx',
+            ),
+            (
+                RecipeTag.objects.filter(tag__in=self.tags).values('recipe'),
+                'recipetag_tag_recipe_idx',
+            ),
+        )
+        for queryset, index_name in cases:
+            with self.subTest(index_name=index_name):
+                self.assertUsesIndex(queryset, index_name)
+
+    def test_recipe_part_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            list(RecipeViewSet().get_queryset())
+            list(RecipeTag.objects.filter(recipe__in=[self.recipe]))
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if 'recipes_recipeingredient' in query['sql']
+            or 'recipes_recipetag' in query['sql']
+        ]
+        self.assertEqual(len(queries), 3)
+        for sql in queries:
+            with self.subTest(sql=sql):
+                self.assertNotIn('JOIN "recipes_recipe" ', sql)
+                self.assertNotIn('pub_date', sql)
+
+    def test_recipe_orderings(self):
+        cases = (
+            (
+                Recipe.objects.order_by(*RECIPE_ORDERING)[:6],
+                'recipe_pub_date_id_idx',
+            ),
+            (
+                Recipe.objects.order_by(*POPULAR_RECIPE_ORDERING)[:6],
+                'recipe_popular_idx',
+            ),
+            (
+                FeedItem.objects.filter(user=self.user).order_by(
+                    '-pub_date', '-recipe_id'
+                )[:6],
+                'feed_user_pub_date_idx',
+            ),
+        )
+        for queryset, index_name in cases:
+            with self.subTest(index_name=index_name):
+                self.assertUsesIndex(queryset, index_name)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True, DATABASE_REPLICAS=[])
+@override_settings(SHARED_CACHE=True)
+class TokenCacheTest(APITestCase):
+    """Кэш токенов и связи пользователя, общие для запроса."""
+
+    def create_user(self, name):
+        return CustomUser.objects.create(
+            username=name, email=f'{name}@foodgram.ru',
+            first_name=name, last_name=name,
+        )
+
+    def get_me(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/me/')
+        token_queries = [
+            query for query in context.captured_queries
+            if Token._meta.db_table in query['sql']
+        ]
+        return response.status_code, len(token_queries)
+
+    def test_token_cache_invalidation(self):
+        user = self.create_user('cached')
+        token = Token.objects.create(user=user)
+        self.assertEqual(self.get_me(token), (200, 1))
+        self.assertEqual(self.get_me(token), (200, 0))
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(token)[0], 401)
+        token = Token.objects.create(user=user)
+        self.assertEqual(self.get_me(token), (200, 1))
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.get_me(token)[0], 401)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_disabled_without_shared_cache(self):
+        token = Token.objects.create(user=self.create_user('uncached'))
+        self.assertEqual(self.get_me(token), (200, 1))
+        self.assertEqual(self.get_me(token), (200, 1))
+
+    def test_user_list_queries(self):
+        reader = self.create_user('reader')
+        self.client.force_authenticate(reader)
+        counts = []
+        for names in (('first',), ('second', 'third', 'fourth')):
+            for name in names:
+                Subscription.objects.create(
+                    subscriber=reader, author=self.create_user(name)
+                )
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/api/users/')
+            self.assertTrue(all(
+                user['is_subscribed']
+                for user in response.data['results']
+                if user['id'] != reader.id
+            ))
+            counts.append(len(context))
+        self.assertEqual(counts[0], counts[1])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(SimpleTestCase):
+    """Выбор базы для чтения в ReplicaMiddleware."""
+
+    def read_database(self, method, path='/api/recipes/', token=None):
+        extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        request = getattr(RequestFactory(), method)(path, **extra)
+        databases = []
+
+        def get_response(request):
+            databases.append(router.db_for_read(Recipe))
+            return HttpResponse()
+
+        ReplicaMiddleware(get_response)(request)
+        return databases[0]
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.read_database('get'), 'replica')
+        self.assertEqual(self.read_database('get', '/admin/'), 'default')
+        self.assertEqual(self.read_database('get', token='writer'), 'replica')
+        self.assertEqual(self.read_database('post', token='writer'), 'default')
+        self.assertEqual(self.read_database('get', token='writer'), 'default')
+        self.assertEqual(self.read_database('get', token='reader'), 'replica')
+        with read_from('replica'):
+            self.assertEqual(router.db_for_read(Token), 'default')
+
+
+class RecipeJSONParserTest(SimpleTestCase):
+    """Потоковый разбор изображения в теле запроса."""
+
+    image = bytes(range(256)) * 3
+
+    def parse(self, escaped_image, chunk_size=5):
+        body = (
+            '{"name": "Рецепт", '
+            f'"image": "data:image/png;base64,{escaped_image}"}}'
+        ).encode()
+        with mock.patch('api.parsers.STREAM_CHUNK_SIZE', chunk_size):
+            return RecipeJSONParser().parse(io.BytesIO(body))
+
+    def test_json_escapes(self):
+        encoded = base64.b64encode(self.image).decode()
+        self.assertIn('/', encoded)
+        for escaped in (
+            encoded,
+            encoded.replace('/', '\\/'),
+            encoded.replace('/', '\\u002F'),
+        ):
+            with self.subTest(escaped=escaped[:20]):
+                data = self.parse(escaped)
+                self.assertEqual(data['name'], 'Рецепт')
+                self.assertEqual(data['image'].read(), self.image)
+        for escaped in ('AA\\xA', 'AA\\u00G1'):
+            with self.subTest(escaped=escaped):
+                with self.assertRaises(ParseError):
+                    self.parse(escaped)
@@ -15,4 +15,5 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('subscriber', 'author')
+    ordering = ('subscriber__username',)
     empty_value_display = '-пусто-'
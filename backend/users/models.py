@@ -45,17 +45,24 @@ class Subscription(models.Model):
         CustomUser,
         on_delete=models.CASCADE,
         related_name='subscriber',
+        db_index=False,
     )
     author = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
         related_name='author',
+        db_index=False,
     )
 
     class Meta:
-        ordering = ('subscriber__username',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(
+                fields=['author', 'subscriber'],
+                name='subscription_author_idx',
+            ),
+        ]
         constraints = [
             UniqueConstraint(
                 fields=['subscriber', 'author'],